@@ -1,11 +1,40 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, flash, session, jsonify, g,
+                   has_request_context, stream_with_context, send_file, abort)
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as SessionFlask
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import os
 from functools import wraps
 import requests
 import json
+import threading
+import time
+import base64
+import gzip
+import hashlib
+import random
+import hmac
+import codecs
+import click
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import multiprocessing
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from requests.adapters import HTTPAdapter
+import urllib3
+from sqlalchemy import func, case, and_, or_, true, inspect, text, event, insert, select, update, delete, literal, bindparam
+from sqlalchemy.orm import Session as SessionORM, undefer_group, with_expression
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as DelaiPoolDepasse
+import images
+from prometheus_client import (Histogram, Gauge, Counter, CollectorRegistry, generate_latest,
+                               multiprocess, CONTENT_TYPE_LATEST, REGISTRY)
 
 # Création de l'application Flask
 app = Flask(__name__)
@@ -20,17 +49,162 @@ if database_url.startswith("postgres://"):
     database_url = database_url.replace("postgres://", "postgresql://", 1)
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 
+# Réplique en lecture optionnelle pour les listes et le tableau de bord
+database_read_url = os.environ.get('DATABASE_READ_URL')
+if database_read_url and database_read_url.startswith("postgres://"):
+    database_read_url = database_read_url.replace("postgres://", "postgresql://", 1)
+# Après une écriture, l'utilisateur lit la base principale pendant ce délai (retard de réplication)
+DATABASE_READ_LAG_SECONDS = float(os.environ.get('DATABASE_READ_LAG_SECONDS', 10))
+
+# Pool de connexions : Render ferme les connexions Postgres inactives, d'où la vérification
+# avant usage (pre_ping) et le recyclage des connexions plus anciennes que DB_POOL_RECYCLE
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 280))  # secondes
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # secondes
+
+class PoolInstrumente(QueuePool):
+    """QueuePool qui mesure l'attente d'une connexion et publie son occupation (voir MÉTRIQUES)"""
+    
+    def _nom(self):
+        return getattr(self, 'logging_name', None) or 'principal'
+    
+    def _publier(self):
+        POOL_CONNEXIONS.labels(moteur=self._nom(), etat='utilisees').set(self.checkedout())
+        POOL_CONNEXIONS.labels(moteur=self._nom(), etat='debordement').set(max(0, self.overflow()))
+    
+    def _do_get(self):
+        debut = time.perf_counter()
+        try:
+            connexion = super()._do_get()
+        except DelaiPoolDepasse:
+            POOL_DELAIS_DEPASSES.labels(moteur=self._nom()).inc()
+            raise
+        finally:
+            POOL_ATTENTE.labels(moteur=self._nom()).observe(time.perf_counter() - debut)
+        self._publier()
+        return connexion
+    
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._publier()
+
+def options_moteur(url, nom):
+    """Options du moteur SQLAlchemy (une base SQLite en mémoire garde le pool par défaut)"""
+    options = {'pool_pre_ping': DB_POOL_PRE_PING, 'pool_recycle': DB_POOL_RECYCLE}
+    if url.startswith('sqlite') and (':memory:' in url or url.rstrip('/') == 'sqlite:'):
+        return options
+    options.update(poolclass=PoolInstrumente, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                   pool_timeout=DB_POOL_TIMEOUT, pool_logging_name=nom)
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options_moteur(database_url, 'principal')
+if database_read_url:
+    app.config['SQLALCHEMY_BINDS'] = {'lecture': {'url': database_read_url,
+                                                  **options_moteur(database_read_url, 'lecture')}}
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+# Images téléversées : extensions acceptées, processus de génération des variantes
+# et URL publique de l'admin (les URLs d'images sont consultées par le site principal)
+EXTENSIONS_IMAGES = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+MEDIA_BASE_URL = os.environ.get('MEDIA_BASE_URL', '').rstrip('/')
+
+class SessionRoutee(SessionFlask):
+    """Session qui envoie les SELECT des vues marquées @lecture_replica vers la réplique en lecture"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and database_read_url and not self._flushing and getattr(clause, 'is_select', False)
+                and has_request_context() and g.get('lecture_replica')):
+            return db.engines['lecture']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Initialisation de la base de données
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': SessionRoutee})
 
 # Configuration pour l'API du site principal
 SITE_URL = os.environ.get('SITE_URL', 'https://labmath-scsmaubmar-org.onrender.com')
 API_KEY = os.environ.get('API_KEY', 'votre_api_key_secrete')
 
+# Pagination des listes (taille par défaut et maximale)
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 200))
+
+# Jeton optionnel exigé par /metrics (en-tête Authorization: Bearer <jeton>)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Profilage SQL par requête (débogage) : requêtes répétées (N+1) et requêtes lentes
+SQL_PROFILER = os.environ.get('SQL_PROFILER', 'false').lower() == 'true'
+SQL_SLOW_MS = float(os.environ.get('SQL_SLOW_MS', 100))
+SQL_PROFILER_REPETITIONS = int(os.environ.get('SQL_PROFILER_REPETITIONS', 5))  # seuil de détection N+1
+
+# Import / export en masse
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 500))
+IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+
+# Taille maximale d'une page du flux de modifications (/api/changes)
+CHANGES_LIMIT_MAX = int(os.environ.get('CHANGES_LIMIT_MAX', 1000))
+
+# Configuration du worker de synchronisation (file d'attente / outbox)
+SYNC_WORKER_ENABLED = os.environ.get('SYNC_WORKER_ENABLED', 'true').lower() == 'true'
+SYNC_WORKER_INTERVAL = float(os.environ.get('SYNC_WORKER_INTERVAL', 5))
+SYNC_OUTBOX_BATCH = int(os.environ.get('SYNC_OUTBOX_BATCH', 20))
+SYNC_OUTBOX_MAX_TENTATIVES = int(os.environ.get('SYNC_OUTBOX_MAX_TENTATIVES', 5))
+SYNC_OUTBOX_DELAI_ESSAI = int(os.environ.get('SYNC_OUTBOX_DELAI_ESSAI', 60))  # secondes
+SYNC_OUTBOX_RETENTION_JOURS = int(os.environ.get('SYNC_OUTBOX_RETENTION_JOURS', 7))
+SYNC_PROCESSING_TIMEOUT = int(os.environ.get('SYNC_PROCESSING_TIMEOUT', 300))  # secondes
+# Regroupement des enregistrements successifs d'un même élément en une seule synchronisation
+SYNC_DEBOUNCE_SECONDS = float(os.environ.get('SYNC_DEBOUNCE_SECONDS', 10))
+SYNC_DEBOUNCE_MAX_SECONDS = float(os.environ.get('SYNC_DEBOUNCE_MAX_SECONDS', 60))  # délai maximal depuis la 1re modification
+# Suppressions distantes : jamais abandonnées, avec un délai entre deux essais plafonné
+SYNC_SUPPRESSION_DELAI_MAX = int(os.environ.get('SYNC_SUPPRESSION_DELAI_MAX', 3600))  # secondes
+
+# Planificateur des échéances (expiration des annonces/offres, publication programmée)
+ECHEANCES_ENABLED = os.environ.get('ECHEANCES_ENABLED', 'true').lower() == 'true'
+ECHEANCES_INTERVAL = int(os.environ.get('ECHEANCES_INTERVAL', 60))  # secondes
+
+# Cache des pages rendues, partagé entre les workers via un fichier SQLite local
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'labmath-pages.sqlite'))
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 500))
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))  # secondes
+
+# Durée de validité de l'état de santé du site principal (sonde en arrière-plan)
+HEALTH_CACHE_TTL = int(os.environ.get('HEALTH_CACHE_TTL', 30))  # secondes
+
+# Taille des tranches des parcours de tables complètes (un commit par tranche)
+SYNC_CHUNK_SIZE = int(os.environ.get('SYNC_CHUNK_SIZE', 50))
+
+# Nombre maximal de requêtes simultanées vers le site principal
+SYNC_CONCURRENCY = int(os.environ.get('SYNC_CONCURRENCY', 8))
+
+# Client HTTP partagé : les connexions keep-alive vers SITE_URL sont réutilisées
+site_http = requests.Session()
+_adaptateur_http = HTTPAdapter(pool_connections=4, pool_maxsize=SYNC_CONCURRENCY)
+site_http.mount('http://', _adaptateur_http)
+site_http.mount('https://', _adaptateur_http)
+
+# Reprises (backoff exponentiel avec jitter) et disjoncteur pour les appels au site principal
+SYNC_MAX_RETRIES = int(os.environ.get('SYNC_MAX_RETRIES', 3))
+SYNC_BACKOFF_BASE = float(os.environ.get('SYNC_BACKOFF_BASE', 0.5))  # secondes
+SYNC_BACKOFF_MAX = float(os.environ.get('SYNC_BACKOFF_MAX', 8))  # secondes
+SYNC_RETRY_STATUSES = {int(code) for code in os.environ.get('SYNC_RETRY_STATUSES', '429,500,502,503,504').split(',')}
+CIRCUIT_SEUIL_ECHECS = int(os.environ.get('CIRCUIT_SEUIL_ECHECS', 5))
+CIRCUIT_DUREE_OUVERTURE = int(os.environ.get('CIRCUIT_DUREE_OUVERTURE', 30))  # secondes
+
+# Synchronisation par lots compressés, si le site principal l'annonce (GET /api/capabilities)
+SYNC_BATCH_ENABLED = os.environ.get('SYNC_BATCH_ENABLED', 'true').lower() == 'true'
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', 100))
+SYNC_CAPABILITIES_TTL = int(os.environ.get('SYNC_CAPABILITIES_TTL', 300))  # secondes
+
+# Réconciliation : taille des pages de l'inventaire du site principal (GET /api/<endpoint>/inventory)
+RECONCILIATION_PAGE_SIZE = int(os.environ.get('RECONCILIATION_PAGE_SIZE', 1000))
+
 # --- DÉCORATEUR SÉCURITÉ ---
 def login_required(f):
     @wraps(f)
@@ -40,58 +214,989 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def api_key_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        cle = request.headers.get('X-API-Key', '')
+        if not hmac.compare_digest(cle.encode(), API_KEY.encode()):
+            return jsonify({'success': False, 'message': 'Clé API invalide'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+# --- MÉTRIQUES (PROMETHEUS) ---
+# Avec gunicorn, PROMETHEUS_MULTIPROC_DIR (voir gunicorn.conf.py) agrège les métriques de tous les workers
+
+REQUETE_DUREE = Histogram(
+    'labmath_http_request_duration_seconds', "Durée de traitement des requêtes HTTP",
+    ['endpoint', 'method', 'status']
+)
+REQUETE_SQL_NOMBRE = Histogram(
+    'labmath_sql_queries_per_request', "Nombre de requêtes SQL par requête HTTP",
+    ['endpoint'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+REQUETE_SQL_DUREE = Histogram(
+    'labmath_sql_time_per_request_seconds', "Temps SQL cumulé par requête HTTP",
+    ['endpoint']
+)
+SYNC_DUREE = Histogram(
+    'labmath_sync_call_duration_seconds', "Durée des appels de synchronisation avec le site principal",
+    ['fonction', 'modele', 'resultat']
+)
+POOL_ATTENTE = Histogram(
+    'labmath_db_pool_wait_seconds', "Attente d'une connexion du pool SQLAlchemy",
+    ['moteur'], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+POOL_CONNEXIONS = Gauge(
+    'labmath_db_pool_connections', "Connexions du pool SQLAlchemy (utilisées, en débordement)",
+    ['moteur', 'etat'], multiprocess_mode='livesum'
+)
+POOL_DELAIS_DEPASSES = Counter(
+    'labmath_db_pool_timeouts_total', "Connexions refusées faute de place dans le pool (DB_POOL_TIMEOUT)",
+    ['moteur']
+)
+
+MESSAGE_INCHANGE = "Aucun changement depuis la dernière synchronisation"
+MESSAGE_DISJONCTEUR = "Appel refusé par le disjoncteur (site principal indisponible)"
+
+def mesure_sync(fonction, modele=None):
+    """Mesure la durée et le résultat ('ok', 'inchange', 'echec') d'une fonction de synchronisation"""
+    def decorateur(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            debut = time.perf_counter()
+            success, message = f(*args, **kwargs)
+            if not success:
+                resultat = 'echec'
+            elif message == MESSAGE_INCHANGE:
+                resultat = 'inchange'
+            else:
+                resultat = 'ok'
+            SYNC_DUREE.labels(fonction=fonction, modele=modele or args[0], resultat=resultat).observe(
+                time.perf_counter() - debut)
+            return success, message
+        return wrapper
+    return decorateur
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _debut_requete_sql(conn, cursor, statement, parameters, context, executemany):
+    context._debut_sql = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _fin_requete_sql(conn, cursor, statement, parameters, context, executemany):
+    duree = time.perf_counter() - context._debut_sql
+    if has_request_context() and 'sql_nombre' in g:
+        g.sql_nombre += 1
+        g.sql_duree += duree
+        if 'sql_profil' in g:
+            g.sql_profil.append((statement, duree, site_appel_sql()))
+
+@event.listens_for(Engine, 'commit')
+def _commit_sql(conn):
+    if has_request_context() and 'sql_profil' in g:
+        g.sql_commits += 1
+
+DOSSIER_TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+def site_appel_sql():
+    """Première ligne de l'application (ou d'un template) dans la pile d'appel d'une requête SQL"""
+    cadre = sys._getframe(2)
+    while cadre is not None:
+        fichier = cadre.f_code.co_filename
+        if fichier == __file__ or fichier.startswith(DOSSIER_TEMPLATES):
+            return f"{os.path.basename(fichier)}:{cadre.f_lineno} ({cadre.f_code.co_name})"
+        cadre = cadre.f_back
+    return 'inconnu'
+
+@app.before_request
+def debut_mesure_requete():
+    g.debut_requete = time.perf_counter()
+    g.sql_nombre = 0
+    g.sql_duree = 0.0
+    if SQL_PROFILER:
+        g.sql_profil = []
+        g.sql_commits = 0
+
+@app.after_request
+def fin_mesure_requete(response):
+    if 'debut_requete' in g:
+        endpoint = request.endpoint or 'inconnu'
+        REQUETE_DUREE.labels(endpoint=endpoint, method=request.method, status=response.status_code).observe(
+            time.perf_counter() - g.debut_requete)
+        REQUETE_SQL_NOMBRE.labels(endpoint=endpoint).observe(g.sql_nombre)
+        REQUETE_SQL_DUREE.labels(endpoint=endpoint).observe(g.sql_duree)
+    return response
+
+def analyser_profil_sql(profil):
+    """Regroupe les requêtes identiques : retourne (répétées, lentes) ; répétées = motifs N+1 probables"""
+    groupes = {}
+    for statement, duree, site in profil:
+        groupe = groupes.setdefault(statement, {'nombre': 0, 'duree': 0.0, 'sites': {}})
+        groupe['nombre'] += 1
+        groupe['duree'] += duree
+        groupe['sites'][site] = groupe['sites'].get(site, 0) + 1
+    repetees = sorted(
+        ({'sql': statement, **groupe} for statement, groupe in groupes.items()
+         if groupe['nombre'] >= SQL_PROFILER_REPETITIONS),
+        key=lambda groupe: groupe['nombre'], reverse=True
+    )
+    lentes = [{'sql': statement, 'duree': duree, 'site': site}
+              for statement, duree, site in profil if duree * 1000 >= SQL_SLOW_MS]
+    return repetees, lentes
+
+@app.after_request
+def rapport_profil_sql(response):
+    """Résumé du profilage SQL : en-tête X-SQL-Profile et ligne de journal"""
+    if 'sql_profil' not in g:
+        return response
+    repetees, lentes = analyser_profil_sql(g.sql_profil)
+    resume = (f"requetes={len(g.sql_profil)}; duree_ms={g.sql_duree * 1000:.1f}; commits={g.sql_commits}; "
+              f"repetees={len(repetees)}; lentes={len(lentes)}")
+    response.headers['X-SQL-Profile'] = resume
+    
+    lignes = [f"Profil SQL {request.method} {request.path} : {resume}"]
+    for groupe in repetees:
+        sites = ', '.join(f"{site} x{nombre}" for site, nombre in groupe['sites'].items())
+        lignes.append(f"  N+1 probable : {groupe['nombre']} fois ({groupe['duree'] * 1000:.1f} ms) depuis {sites} : "
+                      f"{' '.join(groupe['sql'].split())[:200]}")
+    for requete in lentes:
+        lignes.append(f"  Requête lente : {requete['duree'] * 1000:.1f} ms depuis {requete['site']} : "
+                      f"{' '.join(requete['sql'].split())[:200]}")
+    if repetees or lentes:
+        app.logger.warning('\n'.join(lignes))
+    else:
+        app.logger.info(lignes[0])
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Export des métriques au format texte Prometheus"""
+    if METRICS_TOKEN:
+        attendu = f"Bearer {METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), attendu.encode()):
+            return jsonify({'success': False, 'message': 'Jeton invalide'}), 401
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registre = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registre)
+    else:
+        registre = REGISTRY
+    return generate_latest(registre), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+def etat_pools():
+    """Occupation des pools de connexions de ce processus, par moteur"""
+    etats = {}
+    for nom, moteur in db.engines.items():
+        pool = moteur.pool
+        etat = {'classe': type(pool).__name__, 'statut': pool.status()}
+        if isinstance(pool, QueuePool):
+            etat.update(taille=pool.size(), utilisees=pool.checkedout(), disponibles=pool.checkedin(),
+                        debordement=max(0, pool.overflow()), debordement_max=pool._max_overflow,
+                        delai_attente=pool.timeout())
+        etats[nom or 'principal'] = etat
+    return etats
+
+@app.route('/admin/pool')
+@login_required
+def pool_route():
+    """État des pools de connexions du worker qui répond (JSON)"""
+    return jsonify({'success': True, 'pid': os.getpid(), 'pools': etat_pools()})
+
+# --- PAGINATION PAR CURSEUR ---
+
+def _encoder_curseur(objet):
+    """Encode la position (date_creation, id) d'un élément dans un curseur opaque"""
+    brut = f"{objet.date_creation.isoformat()}|{objet.id}"
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+def _decoder_curseur(curseur):
+    """Décode un curseur, retourne None s'il est absent ou invalide"""
+    if not curseur:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)).decode()
+        date_str, id_str = brut.rsplit('|', 1)
+        return datetime.fromisoformat(date_str), int(id_str)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def paginer_keyset(query, modele):
+    """Pagine une requête sur (date_creation, id) décroissants, à coût constant quelle que soit la page"""
+    taille = min(max(request.args.get('taille', PAGE_SIZE, type=int), 1), PAGE_SIZE_MAX)
+    apres = _decoder_curseur(request.args.get('apres'))
+    avant = _decoder_curseur(request.args.get('avant'))
+    
+    if avant:
+        # Page précédente : on parcourt dans l'ordre croissant puis on inverse
+        date_ref, id_ref = avant
+        elements = query.filter(or_(
+            modele.date_creation > date_ref,
+            and_(modele.date_creation == date_ref, modele.id > id_ref)
+        )).order_by(modele.date_creation.asc(), modele.id.asc()).limit(taille + 1).all()
+        a_precedent = len(elements) > taille
+        elements = list(reversed(elements[:taille]))
+        a_suivant = True
+    else:
+        if apres:
+            date_ref, id_ref = apres
+            query = query.filter(or_(
+                modele.date_creation < date_ref,
+                and_(modele.date_creation == date_ref, modele.id < id_ref)
+            ))
+        elements = query.order_by(modele.date_creation.desc(), modele.id.desc()).limit(taille + 1).all()
+        a_suivant = len(elements) > taille
+        elements = elements[:taille]
+        a_precedent = apres is not None
+    
+    return {
+        'elements': elements,
+        'taille': taille,
+        'suivant': _encoder_curseur(elements[-1]) if a_suivant and elements else None,
+        'precedent': _encoder_curseur(elements[0]) if a_precedent and elements else None
+    }
+
 # --- MODÈLES ---
 class Activite(db.Model):
     __tablename__ = 'activites'
     id = db.Column(db.Integer, primary_key=True)
     titre = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text)
-    contenu = db.Column(db.Text)
+    # Textes longs différés : chargés seulement à la demande (groupe 'texte')
+    description = db.deferred(db.Column(db.Text), group='texte')
+    contenu = db.deferred(db.Column(db.Text), group='texte')
+    extrait = db.query_expression()
     image_url = db.Column(db.String(500))
     auteur = db.Column(db.String(100))
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
     date_modification = db.Column(db.DateTime, onupdate=datetime.utcnow)
     est_publie = db.Column(db.Boolean, default=True)
     sync_id = db.Column(db.String(100))  # ID de synchronisation sur le site principal
+    sync_hash = db.Column(db.String(64))  # Empreinte du dernier payload synchronisé
+
+    __table_args__ = (
+        db.Index('ix_activites_date_creation_id', date_creation, id),
+        db.Index('ix_activites_publiees_date', date_creation,
+                 postgresql_where=(est_publie == True), sqlite_where=(est_publie == True)),
+        db.Index('ix_activites_sync_id', sync_id),
+    )
 
 class Realisation(db.Model):
     __tablename__ = 'realisations'
     id = db.Column(db.Integer, primary_key=True)
     titre = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text)
+    description = db.deferred(db.Column(db.Text), group='texte')
+    extrait = db.query_expression()
     image_url = db.Column(db.String(500))
     categorie = db.Column(db.String(100))
     date_realisation = db.Column(db.Date)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, onupdate=datetime.utcnow)
     sync_id = db.Column(db.String(100))
+    sync_hash = db.Column(db.String(64))  # Empreinte du dernier payload synchronisé
+
+    __table_args__ = (
+        db.Index('ix_realisations_date_creation_id', date_creation, id),
+        db.Index('ix_realisations_sync_id', sync_id),
+    )
 
 class Annonce(db.Model):
     __tablename__ = 'annonces'
     id = db.Column(db.Integer, primary_key=True)
     titre = db.Column(db.String(200), nullable=False)
-    contenu = db.Column(db.Text)
+    contenu = db.deferred(db.Column(db.Text), group='texte')
+    extrait = db.query_expression()
     type_annonce = db.Column(db.String(50))
     date_debut = db.Column(db.DateTime)
     date_fin = db.Column(db.DateTime)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, onupdate=datetime.utcnow)
     est_active = db.Column(db.Boolean, default=True)
     sync_id = db.Column(db.String(100))
+    sync_hash = db.Column(db.String(64))  # Empreinte du dernier payload synchronisé
+
+    __table_args__ = (
+        db.Index('ix_annonces_date_creation_id', date_creation, id),
+        db.Index('ix_annonces_actives_date', date_creation,
+                 postgresql_where=(est_active == True), sqlite_where=(est_active == True)),
+        db.Index('ix_annonces_sync_id', sync_id),
+        db.Index('ix_annonces_actives_date_fin', date_fin,
+                 postgresql_where=(est_active == True), sqlite_where=(est_active == True)),
+        db.Index('ix_annonces_actives_date_debut', date_debut,
+                 postgresql_where=(est_active == True), sqlite_where=(est_active == True)),
+    )
 
 class Offre(db.Model):
     __tablename__ = 'offres'
     id = db.Column(db.Integer, primary_key=True)
     titre = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text)
+    description = db.deferred(db.Column(db.Text), group='texte')
+    extrait = db.query_expression()
     type_offre = db.Column(db.String(50))
     lieu = db.Column(db.String(100))
     date_limite = db.Column(db.Date)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, onupdate=datetime.utcnow)
     est_active = db.Column(db.Boolean, default=True)
     sync_id = db.Column(db.String(100))
+    sync_hash = db.Column(db.String(64))  # Empreinte du dernier payload synchronisé
+
+    __table_args__ = (
+        db.Index('ix_offres_date_creation_id', date_creation, id),
+        db.Index('ix_offres_actives_date', date_creation,
+                 postgresql_where=(est_active == True), sqlite_where=(est_active == True)),
+        db.Index('ix_offres_sync_id', sync_id),
+        db.Index('ix_offres_actives_date_limite', date_limite,
+                 postgresql_where=(est_active == True), sqlite_where=(est_active == True)),
+    )
+
+class SyncOutbox(db.Model):
+    """File d'attente persistante des opérations à envoyer au site principal"""
+    __tablename__ = 'sync_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    modele = db.Column(db.String(20), nullable=False)  # 'activite', 'realisation', 'annonce', 'offre'
+    objet_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False, default='sync')  # 'sync' ou 'delete'
+    sync_id = db.Column(db.String(100))  # ID distant conservé pour les suppressions
+    statut = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'processing', 'ok', 'failed'
+    tentatives = db.Column(db.Integer, default=0)
+    message = db.Column(db.Text)
+    prochain_essai = db.Column(db.DateTime, default=datetime.utcnow)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_sync_outbox_statut_essai', 'statut', 'prochain_essai'),
+        db.Index('ix_sync_outbox_objet', 'modele', 'objet_id'),
+    )
+
+class JournalModification(db.Model):
+    """Journal des écritures : chaque modification reçoit une version globale croissante"""
+    __tablename__ = 'journal_modifications'
+    version = db.Column(db.Integer, primary_key=True)
+    modele = db.Column(db.String(20), nullable=False)
+    objet_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # 'upsert' ou 'delete' (tombstone)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_journal_modele_version', 'modele', 'version'),
+        {'sqlite_autoincrement': True},  # pas de réutilisation des versions
+    )
+
+MODELES = {
+    'activite': Activite,
+    'realisation': Realisation,
+    'annonce': Annonce,
+    'offre': Offre
+}
+
+PLURIELS = {
+    'activite': 'activites',
+    'realisation': 'realisations',
+    'annonce': 'annonces',
+    'offre': 'offres'
+}
+
+# Texte principal de chaque modèle, dont un extrait est affiché dans les listes
+TEXTES_PRINCIPAUX = {
+    'activite': 'description',
+    'realisation': 'description',
+    'annonce': 'contenu',
+    'offre': 'description'
+}
+TAILLE_EXTRAIT = 150
+
+def avec_extrait(modele, requete):
+    """Ajoute à une requête un extrait du texte principal, sans charger les colonnes différées"""
+    Modele = MODELES[modele]
+    colonne = getattr(Modele, TEXTES_PRINCIPAUX[modele])
+    return requete.options(with_expression(Modele.extrait, func.substr(colonne, 1, TAILLE_EXTRAIT)))
+
+LIBELLES = {
+    'activite': 'Activités',
+    'realisation': 'Réalisations',
+    'annonce': 'Annonces',
+    'offre': 'Offres'
+}
+
+def filtre_publication(modele):
+    """Condition SQL des éléments qui doivent être présents sur le site principal"""
+    if modele == 'activite':
+        return Activite.est_publie == True
+    if modele == 'annonce':
+        # Une annonce programmée n'est publiée qu'à partir de sa date de début
+        return and_(Annonce.est_active == True,
+                    or_(Annonce.date_debut == None, Annonce.date_debut <= datetime.utcnow()))
+    if modele == 'offre':
+        return MODELES[modele].est_active == True
+    return true()
+
+# --- JOURNAL DES MODIFICATIONS ---
+
+NOMS_MODELES = {Modele: modele for modele, Modele in MODELES.items()}
+
+# Colonnes de suivi de synchronisation : leur mise à jour n'est pas une modification du contenu
+COLONNES_TECHNIQUES = {'sync_id', 'sync_hash'}
+
+@event.listens_for(SessionORM, 'before_flush')
+def conserver_date_modification(session_db, contexte, instances):
+    """Une écriture limitée aux colonnes techniques ne change pas date_modification (ETag de l'API)"""
+    for objet in session_db.dirty:
+        if type(objet) not in NOMS_MODELES:
+            continue
+        modifiees = {attr.key for attr in inspect(objet).attrs if attr.history.has_changes()}
+        if modifiees and modifiees <= COLONNES_TECHNIQUES:
+            # Valeur actuelle réécrite explicitement : l'onupdate de la colonne ne s'applique pas
+            objet.date_modification
+            flag_modified(objet, 'date_modification')
+
+# Clé du verrou consultatif Postgres qui sérialise les transactions écrivant dans le journal
+VERROU_JOURNAL = 7410001
+
+def verrouiller_journal(connexion):
+    """Réserve le journal jusqu'à la fin de la transaction.
+    
+    Les versions sont attribuées à l'INSERT, pas au commit : sans ce verrou, une transaction portant
+    la version N pourrait valider après qu'un lecteur de /api/changes a déjà servi N+1, et N serait
+    perdue. SQLite sérialise déjà les transactions d'écriture.
+    """
+    if connexion.dialect.name == 'postgresql':
+        connexion.execute(text("SELECT pg_advisory_xact_lock(:cle)"), {'cle': VERROU_JOURNAL})
+
+def journaliser(modele, ids, action='upsert'):
+    """Journalise des écritures SQL en masse (qui ne passent pas par le flush de l'ORM)"""
+    maintenant = datetime.utcnow()
+    lignes = [{'modele': modele, 'objet_id': objet_id, 'action': action, 'date_creation': maintenant}
+              for objet_id in ids]
+    if lignes:
+        verrouiller_journal(db.session.connection())
+        db.session.execute(insert(JournalModification), lignes)
+        marquer_modification(db.session, modele)
+
+@event.listens_for(SessionORM, 'after_flush')
+def journaliser_flush(session_db, contexte):
+    """Journalise les créations, modifications et suppressions faites via l'ORM"""
+    lignes = []
+    for objet in session_db.new:
+        if type(objet) in NOMS_MODELES:
+            lignes.append((NOMS_MODELES[type(objet)], objet.id, 'upsert'))
+    for objet in session_db.dirty:
+        if type(objet) in NOMS_MODELES:
+            modifiees = {attr.key for attr in inspect(objet).attrs if attr.history.has_changes()}
+            # date_modification seule est réécrite par conserver_date_modification : pas une modification
+            if modifiees - COLONNES_TECHNIQUES - {'date_modification'}:
+                lignes.append((NOMS_MODELES[type(objet)], objet.id, 'upsert'))
+    for objet in session_db.deleted:
+        if type(objet) in NOMS_MODELES:
+            lignes.append((NOMS_MODELES[type(objet)], objet.id, 'delete'))
+    
+    if lignes:
+        maintenant = datetime.utcnow()
+        verrouiller_journal(session_db.connection())
+        session_db.connection().execute(insert(JournalModification), [
+            {'modele': modele, 'objet_id': objet_id, 'action': action, 'date_creation': maintenant}
+            for modele, objet_id, action in lignes
+        ])
+        marquer_modification(session_db, *{modele for modele, _, _ in lignes})
+    # États de synchronisation affichés dans les listes (file d'attente, sync_id, date_sync...)
+    if any(isinstance(objet, SyncOutbox) or type(objet) in NOMS_MODELES
+           for objet in (*session_db.new, *session_db.dirty, *session_db.deleted)):
+        marquer_modification(session_db, 'sync')
+
+# --- CACHE DES PAGES RENDUES ---
+
+class CachePages:
+    """Cache LRU de pages rendues, partagé entre les processus d'une même machine (fichier SQLite).
+    
+    Chaque page dépend de « générations » (une par modèle, plus 'sync') incluses dans sa clé :
+    incrémenter une génération invalide d'un coup toutes les pages qui en dépendent, dans tous les workers.
+    """
+    
+    def __init__(self, chemin, max_entrees, ttl):
+        self.chemin = chemin
+        self.max_entrees = max_entrees
+        self.ttl = ttl
+        self._local = threading.local()
+    
+    def _connexion(self):
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is None or self._local.pid != os.getpid():
+            connexion = sqlite3.connect(self.chemin, timeout=5, isolation_level=None, check_same_thread=False)
+            connexion.execute("PRAGMA journal_mode=WAL")
+            connexion.execute("PRAGMA synchronous=NORMAL")
+            connexion.execute("CREATE TABLE IF NOT EXISTS pages (cle TEXT PRIMARY KEY, contenu BLOB NOT NULL, "
+                              "cree REAL NOT NULL, acces REAL NOT NULL)")
+            connexion.execute("CREATE INDEX IF NOT EXISTS ix_pages_acces ON pages (acces)")
+            connexion.execute("CREATE TABLE IF NOT EXISTS generations (nom TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+            self._local.connexion = connexion
+            self._local.pid = os.getpid()
+        return connexion
+    
+    def generations(self, noms):
+        lignes = dict(self._connexion().execute(
+            f"SELECT nom, generation FROM generations WHERE nom IN ({','.join('?' * len(noms))})", noms
+        ).fetchall())
+        return tuple(lignes.get(nom, 0) for nom in noms)
+    
+    def incrementer(self, noms):
+        self._connexion().executemany(
+            "INSERT INTO generations (nom, generation) VALUES (?, 1) "
+            "ON CONFLICT(nom) DO UPDATE SET generation = generation + 1", [(nom,) for nom in noms]
+        )
+    
+    def lire(self, cle):
+        connexion = self._connexion()
+        maintenant = time.time()
+        ligne = connexion.execute("SELECT contenu, cree FROM pages WHERE cle = ?", (cle,)).fetchone()
+        if ligne is None or maintenant - ligne[1] > self.ttl:
+            return None
+        connexion.execute("UPDATE pages SET acces = ? WHERE cle = ?", (maintenant, cle))
+        return ligne[0]
+    
+    def ecrire(self, cle, contenu, ttl=None):
+        connexion = self._connexion()
+        maintenant = time.time()
+        # Durée de vie plus courte : l'entrée est datée comme si elle avait été créée plus tôt
+        cree = maintenant - max(0, self.ttl - ttl) if ttl is not None else maintenant
+        connexion.execute("INSERT OR REPLACE INTO pages (cle, contenu, cree, acces) VALUES (?, ?, ?, ?)",
+                          (cle, contenu, cree, maintenant))
+        # Éviction LRU : on ne garde que les entrées les plus récemment lues
+        connexion.execute("DELETE FROM pages WHERE cle IN (SELECT cle FROM pages ORDER BY acces DESC "
+                          "LIMIT -1 OFFSET ?)", (self.max_entrees,))
+    
+    def vider(self):
+        self._connexion().execute("DELETE FROM pages")
+
+cache_pages = CachePages(PAGE_CACHE_PATH, PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_TTL)
+
+def marquer_modification(session_db, *noms):
+    """Note les générations à incrémenter au commit de la session"""
+    session_db.info.setdefault('generations_modifiees', set()).update(noms)
+
+@event.listens_for(SessionORM, 'after_commit')
+def invalider_pages(session_db):
+    noms = session_db.info.pop('generations_modifiees', None)
+    if noms and has_request_context():
+        # Lire ses propres écritures : les pages suivantes évitent la réplique (voir lecture_replica)
+        session['derniere_ecriture'] = time.time()
+    if noms and PAGE_CACHE_ENABLED:
+        try:
+            cache_pages.incrementer(sorted(noms))
+        except sqlite3.Error as e:
+            app.logger.error(f"Erreur d'invalidation du cache des pages: {str(e)}")
+
+@event.listens_for(SessionORM, 'after_rollback')
+def oublier_modifications(session_db):
+    session_db.info.pop('generations_modifiees', None)
+
+def page_en_cache(*dependances, cle_supplementaire=None):
+    """Met en cache une page GET rendue, invalidée par les écritures sur les modèles dont elle dépend"""
+    def decorateur(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # Pas de cache si des messages flash attendent d'être affichés
+            if not PAGE_CACHE_ENABLED or request.method != 'GET' or session.get('_flashes'):
+                return f(*args, **kwargs)
+            try:
+                generations = cache_pages.generations(dependances)
+                cle = hashlib.sha256('|'.join([
+                    request.full_path, str(session.get('username')), str(generations),
+                    str(cle_supplementaire() if cle_supplementaire else '')
+                ]).encode()).hexdigest()
+                contenu = cache_pages.lire(cle)
+            except sqlite3.Error as e:
+                app.logger.error(f"Erreur de lecture du cache des pages: {str(e)}")
+                return f(*args, **kwargs)
+            
+            if contenu is not None:
+                response = app.response_class(contenu, mimetype='text/html')
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'text/html' and not session.get('_flashes'):
+                try:
+                    # Page lue sur la réplique : possiblement en retard, conservée moins longtemps
+                    ttl = DATABASE_READ_LAG_SECONDS if g.get('lecture_replica') else None
+                    cache_pages.ecrire(cle, response.get_data(), ttl)
+                except sqlite3.Error as e:
+                    app.logger.error(f"Erreur d'écriture du cache des pages: {str(e)}")
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorateur
+
+def lecture_replica(f):
+    """Sert les SELECT d'une vue depuis la réplique en lecture, sauf juste après une écriture de l'utilisateur"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if database_read_url and time.time() - session.get('derniere_ecriture', 0) > DATABASE_READ_LAG_SECONDS:
+            g.lecture_replica = True
+        return f(*args, **kwargs)
+    return wrapper
+
+def est_publiable(modele, objet):
+    """Indique si un élément doit être présent sur le site principal"""
+    if modele == 'activite':
+        return bool(objet.est_publie)
+    if modele == 'annonce':
+        return bool(objet.est_active) and (objet.date_debut is None or objet.date_debut <= datetime.utcnow())
+    if modele == 'offre':
+        return bool(objet.est_active)
+    return True
+
+# --- RECHERCHE PLEIN TEXTE ---
+
+# Colonnes indexées en plus du titre (qui pèse plus lourd dans le classement)
+CHAMPS_RECHERCHE = {
+    'activite': ('description', 'contenu'),
+    'realisation': ('description',),
+    'annonce': ('contenu',),
+    'offre': ('description',)
+}
+COLONNES_RECHERCHE = {'titre', 'description', 'contenu'}
+
+# SQLite : table FTS5 dont le rowid encode l'élément (id * 4 + rang du modèle)
+RANGS_MODELES = {modele: rang for rang, modele in enumerate(MODELES)}
+MODELES_PAR_RANG = {rang: modele for modele, rang in RANGS_MODELES.items()}
+
+# Présence de l'index, vérifiée par chaque processus (l'index peut être créé par un autre)
+_recherche = {'active': False, 'verifie_le': 0.0, 'pid': None}
+RECHERCHE_DELAI_VERIFICATION = 30  # secondes entre deux vérifications tant que l'index est absent
+
+def recherche_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+def recherche_active():
+    """Vrai si l'index de recherche existe ; une absence est revérifiée périodiquement"""
+    if _recherche['pid'] != os.getpid():
+        _recherche.update(active=False, verifie_le=0.0, pid=os.getpid())
+    if not _recherche['active'] and time.monotonic() - _recherche['verifie_le'] > RECHERCHE_DELAI_VERIFICATION:
+        _recherche['active'] = inspect(db.engine).has_table('recherche_index')
+        _recherche['verifie_le'] = time.monotonic()
+    return _recherche['active']
+
+def preparer_index_recherche():
+    """Crée l'index de recherche s'il n'existe pas ; retourne True s'il vient d'être créé"""
+    if recherche_active():
+        return False
+    try:
+        with db.engine.begin() as connexion:
+            if recherche_postgres():
+                connexion.execute(text(
+                    "CREATE TABLE recherche_index (modele VARCHAR(20) NOT NULL, objet_id INTEGER NOT NULL, "
+                    "document TSVECTOR NOT NULL, PRIMARY KEY (modele, objet_id))"
+                ))
+                connexion.execute(text("CREATE INDEX ix_recherche_index_document ON recherche_index USING GIN (document)"))
+            else:
+                connexion.execute(text(
+                    "CREATE VIRTUAL TABLE recherche_index USING fts5(titre, corps, tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+    except Exception:
+        # Créé entre-temps par un autre processus : l'index est utilisable, il n'est pas à remplir ici
+        _recherche['verifie_le'] = 0.0
+        if recherche_active():
+            return False
+        raise
+    _recherche.update(active=True, verifie_le=time.monotonic(), pid=os.getpid())
+    return True
+
+def supprimer_index_recherche(connexion, modele, ids):
+    """Retire des éléments de l'index de recherche"""
+    if not ids or not recherche_active():
+        return
+    if recherche_postgres():
+        connexion.execute(
+            text("DELETE FROM recherche_index WHERE modele = :modele AND objet_id IN :ids")
+            .bindparams(bindparam('ids', expanding=True)),
+            {'modele': modele, 'ids': list(ids)}
+        )
+    else:
+        connexion.execute(
+            text("DELETE FROM recherche_index WHERE rowid IN :rowids").bindparams(bindparam('rowids', expanding=True)),
+            {'rowids': [objet_id * len(MODELES) + RANGS_MODELES[modele] for objet_id in ids]}
+        )
+
+def indexer_recherche(connexion, modele, ids=None):
+    """(Ré)indexe des éléments depuis leur table, dans la transaction en cours (ids=None : toute la table)"""
+    if (ids is not None and not ids) or not recherche_active():
+        return
+    table = MODELES[modele].__tablename__
+    corps = " || ' ' || ".join(f"coalesce({champ}, '')" for champ in CHAMPS_RECHERCHE[modele])
+    filtre = "WHERE id IN :ids" if ids is not None else ""
+    if recherche_postgres():
+        requete = text(
+            f"INSERT INTO recherche_index (modele, objet_id, document) "
+            f"SELECT :modele, id, setweight(to_tsvector('french', coalesce(titre, '')), 'A') || "
+            f"setweight(to_tsvector('french', {corps}), 'B') FROM {table} {filtre} "
+            f"ON CONFLICT (modele, objet_id) DO UPDATE SET document = excluded.document"
+        )
+    else:
+        if ids is not None:
+            supprimer_index_recherche(connexion, modele, ids)
+        requete = text(
+            f"INSERT INTO recherche_index (rowid, titre, corps) "
+            f"SELECT id * {len(MODELES)} + :rang, coalesce(titre, ''), {corps} FROM {table} {filtre}"
+        )
+    if ids is not None:
+        requete = requete.bindparams(bindparam('ids', expanding=True))
+    connexion.execute(requete, {'modele': modele, 'rang': RANGS_MODELES[modele], 'ids': list(ids or [])})
+
+def reindexer_recherche():
+    """Reconstruit entièrement l'index de recherche"""
+    preparer_index_recherche()
+    with db.engine.begin() as connexion:
+        connexion.execute(text("DELETE FROM recherche_index"))
+        for modele in MODELES:
+            indexer_recherche(connexion, modele)
+
+@event.listens_for(SessionORM, 'after_flush')
+def indexer_flush(session_db, contexte):
+    """Tient l'index de recherche à jour pour les écritures faites via l'ORM"""
+    if not recherche_active():
+        return
+    a_indexer = {modele: set() for modele in MODELES}
+    a_retirer = {modele: set() for modele in MODELES}
+    for objet in session_db.new:
+        if type(objet) in NOMS_MODELES:
+            a_indexer[NOMS_MODELES[type(objet)]].add(objet.id)
+    for objet in session_db.dirty:
+        if type(objet) in NOMS_MODELES:
+            if any(inspect(objet).attrs[colonne].history.has_changes()
+                   for colonne in COLONNES_RECHERCHE if colonne in inspect(objet).attrs):
+                a_indexer[NOMS_MODELES[type(objet)]].add(objet.id)
+    for objet in session_db.deleted:
+        if type(objet) in NOMS_MODELES:
+            a_retirer[NOMS_MODELES[type(objet)]].add(objet.id)
+    
+    for modele in MODELES:
+        if a_indexer[modele] or a_retirer[modele]:
+            connexion = session_db.connection()
+            indexer_recherche(connexion, modele, a_indexer[modele])
+            supprimer_index_recherche(connexion, modele, a_retirer[modele])
+
+def _requete_recherche(terme):
+    """Traduit la saisie en requête (tous les mots, en préfixe) ; None si aucun mot"""
+    mots = re.findall(r'\w+', terme.lower())
+    if not mots:
+        return None
+    if recherche_postgres():
+        return ' & '.join(f"{mot}:*" for mot in mots)
+    return ' '.join(f'"{mot}"*' for mot in mots)
+
+def rechercher(terme, page=1, taille=PAGE_SIZE):
+    """Recherche classée par pertinence ; retourne (résultats, page suivante disponible)"""
+    requete = _requete_recherche(terme)
+    if requete is None or not recherche_active():
+        return [], False
+    parametres = {'requete': requete, 'limite': taille + 1, 'decalage': (page - 1) * taille}
+    if recherche_postgres():
+        lignes = db.session.execute(text(
+            "SELECT modele, objet_id FROM recherche_index, to_tsquery('french', :requete) AS requete "
+            "WHERE document @@ requete ORDER BY ts_rank(document, requete) DESC, objet_id DESC "
+            "LIMIT :limite OFFSET :decalage"
+        ), parametres).all()
+        trouves = [(modele, objet_id) for modele, objet_id in lignes]
+    else:
+        lignes = db.session.execute(text(
+            "SELECT rowid FROM recherche_index WHERE recherche_index MATCH :requete "
+            "ORDER BY bm25(recherche_index, 5.0, 1.0) LIMIT :limite OFFSET :decalage"
+        ), parametres).all()
+        trouves = [(MODELES_PAR_RANG[rowid % len(MODELES)], rowid // len(MODELES)) for (rowid,) in lignes]
+    
+    a_suivant = len(trouves) > taille
+    trouves = trouves[:taille]
+    
+    # Une requête par modèle pour charger les éléments trouvés
+    objets = {}
+    for modele, Modele in MODELES.items():
+        ids = [objet_id for m, objet_id in trouves if m == modele]
+        if ids:
+            requete = avec_extrait(modele, Modele.query.filter(Modele.id.in_(ids)))
+            objets.update({(modele, objet.id): objet for objet in requete})
+    resultats = [
+        {'modele': modele, 'libelle': LIBELLES[modele], 'objet': objets[(modele, objet_id)]}
+        for modele, objet_id in trouves if (modele, objet_id) in objets
+    ]
+    return resultats, a_suivant
+
+# --- APPELS AU SITE PRINCIPAL (REPRISES ET DISJONCTEUR) ---
+
+class SiteIndisponible(Exception):
+    """Levée quand le disjoncteur est ouvert : le site principal n'est pas appelé"""
+    pass
+
+class Disjoncteur:
+    """Coupe les appels au site principal après des échecs répétés, puis laisse passer un appel d'essai"""
+    
+    def __init__(self, seuil, duree):
+        self.seuil = seuil
+        self.duree = duree
+        self.echecs = 0
+        self.ouvert_depuis = None
+        self._lock = threading.Lock()
+    
+    @property
+    def est_ouvert(self):
+        with self._lock:
+            return self.ouvert_depuis is not None and time.monotonic() - self.ouvert_depuis < self.duree
+    
+    def autoriser(self):
+        """Indique si un appel peut être tenté maintenant"""
+        with self._lock:
+            if self.ouvert_depuis is None:
+                return True
+            if time.monotonic() - self.ouvert_depuis >= self.duree:
+                # Semi-ouvert : un seul appel d'essai, les autres attendent une nouvelle période
+                self.ouvert_depuis = time.monotonic()
+                return True
+            return False
+    
+    def succes(self):
+        with self._lock:
+            self.echecs = 0
+            self.ouvert_depuis = None
+    
+    def echec(self):
+        with self._lock:
+            self.echecs += 1
+            if self.echecs >= self.seuil:
+                self.ouvert_depuis = time.monotonic()
+
+disjoncteur_site = Disjoncteur(CIRCUIT_SEUIL_ECHECS, CIRCUIT_DUREE_OUVERTURE)
+
+# Réponses indiquant que la requête n'a pas été traitée : une création peut être renvoyée sans risque de doublon
+STATUTS_NON_TRAITES = {429, 503}
+
+def _echec_avant_envoi(erreur):
+    """Vrai si la connexion n'a pas pu être établie : la requête n'a pas atteint le site principal"""
+    if isinstance(erreur, requests.exceptions.ConnectTimeout):
+        return True
+    cause = erreur.args[0] if erreur.args else None
+    return (isinstance(erreur, requests.ConnectionError)
+            and isinstance(getattr(cause, 'reason', None), urllib3.exceptions.NewConnectionError))
+
+def appel_site(methode, url, idempotent=None, **kwargs):
+    """Appelle le site principal avec reprises (backoff exponentiel avec jitter) derrière le disjoncteur.
+    
+    Une requête non idempotente (POST de création par défaut) n'est reprise que si elle n'a pas pu
+    être traitée (connexion impossible, 429/503) : sinon une réponse perdue créerait un doublon.
+    """
+    kwargs.setdefault('timeout', 10)
+    if idempotent is None:
+        idempotent = methode.upper() != 'POST'
+    for tentative in range(SYNC_MAX_RETRIES + 1):
+        if not disjoncteur_site.autoriser():
+            raise SiteIndisponible("site principal indisponible (disjoncteur ouvert), nouvel essai plus tard")
+        
+        try:
+            response = site_http.request(methode, url, **kwargs)
+        except requests.RequestException as e:
+            disjoncteur_site.echec()
+            if tentative == SYNC_MAX_RETRIES or not (idempotent or _echec_avant_envoi(e)):
+                raise
+        else:
+            if response.status_code not in SYNC_RETRY_STATUSES:
+                disjoncteur_site.succes()
+                return response
+            disjoncteur_site.echec()
+            if tentative == SYNC_MAX_RETRIES or not (idempotent or response.status_code in STATUTS_NON_TRAITES):
+                return response
+        
+        # Full jitter : attente aléatoire entre 0 et base * 2^tentative (plafonnée)
+        time.sleep(random.uniform(0, min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_BASE * 2 ** tentative)))
+
+_capacites_site = {'valeur': None, 'expire': 0.0}
+_capacites_lock = threading.Lock()
+
+def capacites_lot():
+    """Capacités de synchronisation par lot du site principal (None si non supportées), mises en cache"""
+    if not SYNC_BATCH_ENABLED:
+        return None
+    with _capacites_lock:
+        if time.monotonic() < _capacites_site['expire']:
+            return _capacites_site['valeur']
+    
+    valeur = None
+    try:
+        response = site_http.get(f"{SITE_URL}/api/capabilities", headers={'X-API-Key': API_KEY}, timeout=5)
+        if response.status_code == 200:
+            lot = response.json().get('batch') or {}
+            if lot:
+                valeur = {
+                    'max_items': max(1, min(int(lot.get('max_items', SYNC_BATCH_SIZE)), SYNC_BATCH_SIZE)),
+                    'gzip': 'gzip' in lot.get('encodings', [])
+                }
+    except (requests.RequestException, ValueError, TypeError, AttributeError):
+        pass
+    
+    with _capacites_lock:
+        _capacites_site['valeur'] = valeur
+        _capacites_site['expire'] = time.monotonic() + SYNC_CAPABILITIES_TTL
+    return valeur
+
+def oublier_capacites_lot():
+    """Force une nouvelle découverte des capacités au prochain appel"""
+    with _capacites_lock:
+        _capacites_site['expire'] = 0.0
 
 # --- FONCTIONS DE SYNCHRONISATION ---
 
-def sync_activite(activite):
+def payload_activite(activite):
+    """Données envoyées au site principal pour une activité"""
+    return {
+        'id': activite.id,
+        'titre': activite.titre,
+        'description': activite.description,
+        'contenu': activite.contenu,
+        'image_url': activite.image_url or '',
+        'auteur': activite.auteur or 'Admin',
+        'date_creation': activite.date_creation.isoformat() if activite.date_creation else datetime.utcnow().isoformat(),
+        'est_publie': activite.est_publie
+    }
+
+def payload_realisation(realisation):
+    """Données envoyées au site principal pour une réalisation"""
+    return {
+        'id': realisation.id,
+        'titre': realisation.titre,
+        'description': realisation.description,
+        'image_url': realisation.image_url or '',
+        'categorie': realisation.categorie or '',
+        'date_realisation': realisation.date_realisation.isoformat() if realisation.date_realisation else None,
+        'date_creation': realisation.date_creation.isoformat() if realisation.date_creation else datetime.utcnow().isoformat()
+    }
+
+def payload_annonce(annonce):
+    """Données envoyées au site principal pour une annonce"""
+    return {
+        'id': annonce.id,
+        'titre': annonce.titre,
+        'contenu': annonce.contenu,
+        'type_annonce': annonce.type_annonce or 'info',
+        'date_debut': annonce.date_debut.isoformat() if annonce.date_debut else None,
+        'date_fin': annonce.date_fin.isoformat() if annonce.date_fin else None,
+        'date_creation': annonce.date_creation.isoformat() if annonce.date_creation else datetime.utcnow().isoformat(),
+        'est_active': annonce.est_active
+    }
+
+def payload_offre(offre):
+    """Données envoyées au site principal pour une offre"""
+    return {
+        'id': offre.id,
+        'titre': offre.titre,
+        'description': offre.description,
+        'type_offre': offre.type_offre or 'autre',
+        'lieu': offre.lieu or '',
+        'date_limite': offre.date_limite.isoformat() if offre.date_limite else None,
+        'date_creation': offre.date_creation.isoformat() if offre.date_creation else datetime.utcnow().isoformat(),
+        'est_active': offre.est_active
+    }
+
+def empreinte_payload(data):
+    """Empreinte SHA-256 stable d'un payload, pour détecter les synchronisations inutiles"""
+    brut = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(brut.encode()).hexdigest()
+
+@mesure_sync('sync_activite', 'activite')
+def sync_activite(activite, force=False, valider=True):
     """Synchronise une activité avec le site principal"""
     try:
         headers = {
@@ -99,17 +1204,10 @@ def sync_activite(activite):
             'Content-Type': 'application/json'
         }
         
-        # Préparer les données
-        data = {
-            'id': activite.id,
-            'titre': activite.titre,
-            'description': activite.description,
-            'contenu': activite.contenu,
-            'image_url': activite.image_url or '',
-            'auteur': activite.auteur or 'Admin',
-            'date_creation': activite.date_creation.isoformat() if activite.date_creation else datetime.utcnow().isoformat(),
-            'est_publie': activite.est_publie
-        }
+        data = payload_activite(activite)
+        empreinte = empreinte_payload(data)
+        if activite.sync_id and activite.sync_hash == empreinte and not force:
+            return True, MESSAGE_INCHANGE
         
         # URL de l'API du site principal
         api_url = f"{SITE_URL}/api/activites"
@@ -117,18 +1215,23 @@ def sync_activite(activite):
             api_url = f"{api_url}/{activite.sync_id}"
         
         # Envoyer la requête
-        response = requests.post(
+        response = appel_site(
+            'POST',
             api_url,
             headers=headers,
             json=data,
-            timeout=10
+            timeout=10,
+            # Création (pas encore de sync_id) : pas de reprise si la requête a pu être traitée
+            idempotent=bool(activite.sync_id)
         )
         
         if response.status_code in [200, 201]:
             result = response.json()
             if result.get('success') and result.get('id'):
                 activite.sync_id = str(result['id'])
-                db.session.commit()
+                activite.sync_hash = empreinte
+                if valider:
+                    db.session.commit()
                 return True, "Activité synchronisée avec succès"
             else:
                 return False, f"Erreur de synchronisation: {result.get('message', 'Erreur inconnue')}"
@@ -138,7 +1241,8 @@ def sync_activite(activite):
     except Exception as e:
         return False, f"Erreur de connexion: {str(e)}"
 
-def sync_realisation(realisation):
+@mesure_sync('sync_realisation', 'realisation')
+def sync_realisation(realisation, force=False, valider=True):
     """Synchronise une réalisation avec le site principal"""
     try:
         headers = {
@@ -146,32 +1250,31 @@ def sync_realisation(realisation):
             'Content-Type': 'application/json'
         }
         
-        data = {
-            'id': realisation.id,
-            'titre': realisation.titre,
-            'description': realisation.description,
-            'image_url': realisation.image_url or '',
-            'categorie': realisation.categorie or '',
-            'date_realisation': realisation.date_realisation.isoformat() if realisation.date_realisation else None,
-            'date_creation': realisation.date_creation.isoformat() if realisation.date_creation else datetime.utcnow().isoformat()
-        }
+        data = payload_realisation(realisation)
+        empreinte = empreinte_payload(data)
+        if realisation.sync_id and realisation.sync_hash == empreinte and not force:
+            return True, MESSAGE_INCHANGE
         
         api_url = f"{SITE_URL}/api/realisations"
         if realisation.sync_id:
             api_url = f"{api_url}/{realisation.sync_id}"
         
-        response = requests.post(
+        response = appel_site(
+            'POST',
             api_url,
             headers=headers,
             json=data,
-            timeout=10
+            timeout=10,
+            idempotent=bool(realisation.sync_id)
         )
         
         if response.status_code in [200, 201]:
             result = response.json()
             if result.get('success') and result.get('id'):
                 realisation.sync_id = str(result['id'])
-                db.session.commit()
+                realisation.sync_hash = empreinte
+                if valider:
+                    db.session.commit()
                 return True, "Réalisation synchronisée avec succès"
             else:
                 return False, f"Erreur de synchronisation: {result.get('message', 'Erreur inconnue')}"
@@ -181,7 +1284,8 @@ def sync_realisation(realisation):
     except Exception as e:
         return False, f"Erreur de connexion: {str(e)}"
 
-def sync_annonce(annonce):
+@mesure_sync('sync_annonce', 'annonce')
+def sync_annonce(annonce, force=False, valider=True):
     """Synchronise une annonce avec le site principal"""
     try:
         headers = {
@@ -189,33 +1293,31 @@ def sync_annonce(annonce):
             'Content-Type': 'application/json'
         }
         
-        data = {
-            'id': annonce.id,
-            'titre': annonce.titre,
-            'contenu': annonce.contenu,
-            'type_annonce': annonce.type_annonce or 'info',
-            'date_debut': annonce.date_debut.isoformat() if annonce.date_debut else None,
-            'date_fin': annonce.date_fin.isoformat() if annonce.date_fin else None,
-            'date_creation': annonce.date_creation.isoformat() if annonce.date_creation else datetime.utcnow().isoformat(),
-            'est_active': annonce.est_active
-        }
+        data = payload_annonce(annonce)
+        empreinte = empreinte_payload(data)
+        if annonce.sync_id and annonce.sync_hash == empreinte and not force:
+            return True, MESSAGE_INCHANGE
         
         api_url = f"{SITE_URL}/api/annonces"
         if annonce.sync_id:
             api_url = f"{api_url}/{annonce.sync_id}"
         
-        response = requests.post(
+        response = appel_site(
+            'POST',
             api_url,
             headers=headers,
             json=data,
-            timeout=10
+            timeout=10,
+            idempotent=bool(annonce.sync_id)
         )
         
         if response.status_code in [200, 201]:
             result = response.json()
             if result.get('success') and result.get('id'):
                 annonce.sync_id = str(result['id'])
-                db.session.commit()
+                annonce.sync_hash = empreinte
+                if valider:
+                    db.session.commit()
                 return True, "Annonce synchronisée avec succès"
             else:
                 return False, f"Erreur de synchronisation: {result.get('message', 'Erreur inconnue')}"
@@ -225,7 +1327,8 @@ def sync_annonce(annonce):
     except Exception as e:
         return False, f"Erreur de connexion: {str(e)}"
 
-def sync_offre(offre):
+@mesure_sync('sync_offre', 'offre')
+def sync_offre(offre, force=False, valider=True):
     """Synchronise une offre avec le site principal"""
     try:
         headers = {
@@ -233,33 +1336,31 @@ def sync_offre(offre):
             'Content-Type': 'application/json'
         }
         
-        data = {
-            'id': offre.id,
-            'titre': offre.titre,
-            'description': offre.description,
-            'type_offre': offre.type_offre or 'autre',
-            'lieu': offre.lieu or '',
-            'date_limite': offre.date_limite.isoformat() if offre.date_limite else None,
-            'date_creation': offre.date_creation.isoformat() if offre.date_creation else datetime.utcnow().isoformat(),
-            'est_active': offre.est_active
-        }
+        data = payload_offre(offre)
+        empreinte = empreinte_payload(data)
+        if offre.sync_id and offre.sync_hash == empreinte and not force:
+            return True, MESSAGE_INCHANGE
         
         api_url = f"{SITE_URL}/api/offres"
         if offre.sync_id:
             api_url = f"{api_url}/{offre.sync_id}"
         
-        response = requests.post(
+        response = appel_site(
+            'POST',
             api_url,
             headers=headers,
             json=data,
-            timeout=10
+            timeout=10,
+            idempotent=bool(offre.sync_id)
         )
         
         if response.status_code in [200, 201]:
             result = response.json()
             if result.get('success') and result.get('id'):
                 offre.sync_id = str(result['id'])
-                db.session.commit()
+                offre.sync_hash = empreinte
+                if valider:
+                    db.session.commit()
                 return True, "Offre synchronisée avec succès"
             else:
                 return False, f"Erreur de synchronisation: {result.get('message', 'Erreur inconnue')}"
@@ -269,6 +1370,7 @@ def sync_offre(offre):
     except Exception as e:
         return False, f"Erreur de connexion: {str(e)}"
 
+@mesure_sync('delete_from_site')
 def delete_from_site(model, sync_id):
     """Supprime un élément du site principal"""
     try:
@@ -293,7 +1395,8 @@ def delete_from_site(model, sync_id):
         
         api_url = f"{SITE_URL}/api/{endpoint}/{sync_id}"
         
-        response = requests.delete(
+        response = appel_site(
+            'DELETE',
             api_url,
             headers=headers,
             timeout=10
@@ -301,12 +1404,691 @@ def delete_from_site(model, sync_id):
         
         if response.status_code in [200, 204]:
             return True, "Élément supprimé du site principal"
+        elif response.status_code in [404, 410]:
+            # Déjà absent du site principal : la suppression est confirmée
+            return True, "Élément déjà absent du site principal"
         else:
             return False, f"Erreur HTTP {response.status_code} lors de la suppression"
             
+    except SiteIndisponible:
+        # Le site principal n'a pas été appelé : ce n'est pas une tentative
+        return False, MESSAGE_DISJONCTEUR
     except Exception as e:
         return False, f"Erreur de connexion: {str(e)}"
 
+PAYLOADS = {
+    'activite': payload_activite,
+    'realisation': payload_realisation,
+    'annonce': payload_annonce,
+    'offre': payload_offre
+}
+
+FONCTIONS_SYNC = {
+    'activite': sync_activite,
+    'realisation': sync_realisation,
+    'annonce': sync_annonce,
+    'offre': sync_offre
+}
+
+def _envoyer_lot(modele, lot, capacites):
+    """Envoie un lot en une requête ; retourne un résultat par élément, ou None si le lot est refusé"""
+    corps = json.dumps(
+        {'items': [{'sync_id': objet.sync_id, 'data': data} for objet, data, _ in lot]},
+        default=str, separators=(',', ':')
+    ).encode()
+    headers = {'X-API-Key': API_KEY, 'Content-Type': 'application/json'}
+    if capacites['gzip']:
+        corps = gzip.compress(corps, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    
+    debut = time.perf_counter()
+    try:
+        # Lot idempotent seulement s'il ne contient que des mises à jour d'éléments déjà connus
+        response = appel_site('POST', f"{SITE_URL}/api/{PLURIELS[modele]}/batch", headers=headers, data=corps,
+                              timeout=30, idempotent=all(objet.sync_id for objet, _, _ in lot))
+        if response.status_code in (404, 405, 415):
+            # Le site ne prend plus en charge les lots : redécouvrir et repasser en unitaire
+            oublier_capacites_lot()
+            return None
+        if response.status_code != 200:
+            resultats = [(False, f"Erreur HTTP {response.status_code}: {response.text[:200]}")] * len(lot)
+        else:
+            reponses = response.json().get('results') or []
+            if len(reponses) != len(lot):
+                resultats = [(False, "Réponse du lot invalide")] * len(lot)
+            else:
+                resultats = []
+                for (objet, _, empreinte), reponse in zip(lot, reponses):
+                    if reponse.get('success') and reponse.get('id'):
+                        objet.sync_id = str(reponse['id'])
+                        objet.sync_hash = empreinte
+                        resultats.append((True, f"{LIBELLES[modele]} : élément synchronisé (lot)"))
+                    else:
+                        resultats.append((False, f"Erreur de synchronisation: {reponse.get('message', 'Erreur inconnue')}"))
+    except Exception as e:
+        resultats = [(False, f"Erreur de connexion: {str(e)}")] * len(lot)
+    
+    SYNC_DUREE.labels(fonction='sync_lot', modele=modele,
+                      resultat='ok' if all(succes for succes, _ in resultats) else 'echec').observe(
+        time.perf_counter() - debut)
+    return resultats
+
+def sync_lot(modele, objets, force=False):
+    """Synchronise plusieurs éléments d'un modèle, par lots compressés si le site principal les accepte"""
+    capacites = capacites_lot()
+    if capacites is None:
+        # Appels unitaires, validés en une seule fois pour tout le lot
+        resultats = [FONCTIONS_SYNC[modele](objet, force, valider=False) for objet in objets]
+        db.session.commit()
+        return resultats
+    
+    resultats = [None] * len(objets)
+    a_envoyer = []
+    for index, objet in enumerate(objets):
+        data = PAYLOADS[modele](objet)
+        empreinte = empreinte_payload(data)
+        if objet.sync_id and objet.sync_hash == empreinte and not force:
+            resultats[index] = (True, MESSAGE_INCHANGE)
+        else:
+            a_envoyer.append((index, (objet, data, empreinte)))
+    
+    taille = capacites['max_items']
+    for debut in range(0, len(a_envoyer), taille):
+        morceau = a_envoyer[debut:debut + taille]
+        reponses = _envoyer_lot(modele, [element for _, element in morceau], capacites)
+        if reponses is None:
+            reponses = [FONCTIONS_SYNC[modele](objet, force, valider=False) for _, (objet, _, _) in morceau]
+        for (index, _), reponse in zip(morceau, reponses):
+            resultats[index] = reponse
+    db.session.commit()
+    return resultats
+
+# --- FILE D'ATTENTE DE SYNCHRONISATION (OUTBOX) ---
+
+_reveil_worker = threading.Event()
+_threads_fond = {}  # nom du thread -> pid du processus qui l'a démarré
+_threads_lock = threading.Lock()
+
+def planifier_sync(modele, objet, delai=None):
+    """Ajoute une synchronisation à la file d'attente, dans la transaction courante.
+    
+    L'entrée n'est disponible qu'après `delai` secondes (SYNC_DEBOUNCE_SECONDS par défaut) : les
+    enregistrements suivants dans cette fenêtre la repoussent, dans la limite de SYNC_DEBOUNCE_MAX_SECONDS
+    après la première modification, et l'état le plus récent est envoyé en une seule fois.
+    """
+    if objet.id is None:
+        db.session.flush()
+    maintenant = datetime.utcnow()
+    disponible = maintenant + timedelta(seconds=SYNC_DEBOUNCE_SECONDS if delai is None else delai)
+    existante = SyncOutbox.query.filter_by(
+        modele=modele, objet_id=objet.id, action='sync', statut='pending'
+    ).first()
+    if existante:
+        plafond = (existante.date_creation or maintenant) + timedelta(seconds=SYNC_DEBOUNCE_MAX_SECONDS)
+        # Ne jamais avancer une entrée retardée par ailleurs (disjoncteur ouvert)
+        existante.prochain_essai = max(existante.prochain_essai or maintenant, min(disponible, plafond))
+        return existante
+    entree = SyncOutbox(modele=modele, objet_id=objet.id, action='sync', prochain_essai=disponible,
+                        date_creation=maintenant)
+    db.session.add(entree)
+    return entree
+
+def planifier_syncs(modele, ids):
+    """Ajoute en une seule insertion des synchronisations pour des éléments nouvellement créés"""
+    maintenant = datetime.utcnow()
+    lignes = [{'modele': modele, 'objet_id': objet_id, 'action': 'sync', 'statut': 'pending', 'tentatives': 0,
+               'prochain_essai': maintenant, 'date_creation': maintenant, 'date_modification': maintenant}
+              for objet_id in ids]
+    if lignes:
+        db.session.execute(insert(SyncOutbox), lignes)
+        marquer_modification(db.session, 'sync')
+
+def planifier_suppressions(modele, elements):
+    """Ajoute en une seule insertion des suppressions distantes ; elements : couples (id, sync_id)"""
+    maintenant = datetime.utcnow()
+    lignes = [{'modele': modele, 'objet_id': objet_id, 'action': 'delete', 'sync_id': sync_id, 'statut': 'pending',
+               'tentatives': 0, 'prochain_essai': maintenant, 'date_creation': maintenant,
+               'date_modification': maintenant}
+              for objet_id, sync_id in elements]
+    if lignes:
+        db.session.execute(insert(SyncOutbox), lignes)
+        marquer_modification(db.session, 'sync')
+
+def planifier_suppression(modele, objet):
+    """Ajoute une suppression distante à la file d'attente, dans la transaction courante"""
+    if not objet.sync_id:
+        return None
+    entree = SyncOutbox(modele=modele, objet_id=objet.id, action='delete', sync_id=objet.sync_id)
+    db.session.add(entree)
+    objet.sync_id = None
+    objet.sync_hash = None
+    return entree
+
+def executer_entree(entree):
+    """Exécute une entrée de la file d'attente et retourne (succès, message)"""
+    if entree.action == 'delete':
+        return delete_from_site(entree.modele, entree.sync_id)
+
+    objet = db.session.get(MODELES[entree.modele], entree.objet_id, options=[undefer_group('texte')])
+    if objet is None:
+        return True, "Élément supprimé entre-temps"
+    if not est_publiable(entree.modele, objet):
+        return True, "Élément non publié, synchronisation ignorée"
+    return FONCTIONS_SYNC[entree.modele](objet)
+
+def executer_lot_entrees(modele, entrees):
+    """Exécute des synchronisations d'un même modèle en un lot ; un résultat par entrée"""
+    Modele = MODELES[modele]
+    objets = {objet.id: objet for objet in Modele.query.options(undefer_group('texte')).filter(
+        Modele.id.in_([e.objet_id for e in entrees]))}
+    resultats = {}
+    a_synchroniser = []
+    for entree in entrees:
+        objet = objets.get(entree.objet_id)
+        if objet is None:
+            resultats[entree.id] = (True, "Élément supprimé entre-temps")
+        elif not est_publiable(modele, objet):
+            resultats[entree.id] = (True, "Élément non publié, synchronisation ignorée")
+        elif objet not in a_synchroniser:
+            a_synchroniser.append(objet)
+    reponses = dict(zip([objet.id for objet in a_synchroniser], sync_lot(modele, a_synchroniser)))
+    return [resultats.get(entree.id) or reponses[entree.objet_id] for entree in entrees]
+
+def traiter_outbox(limite=SYNC_OUTBOX_BATCH):
+    """Traite un lot d'entrées en attente et retourne le nombre d'entrées traitées"""
+    maintenant = datetime.utcnow()
+
+    # Inutile de consommer des tentatives pendant une panne du site principal
+    if disjoncteur_site.est_ouvert:
+        return 0
+
+    # Reprendre les entrées d'un worker interrompu en cours de traitement
+    SyncOutbox.query.filter(
+        SyncOutbox.statut == 'processing',
+        SyncOutbox.date_modification < maintenant - timedelta(seconds=SYNC_PROCESSING_TIMEOUT)
+    ).update({'statut': 'pending', 'date_modification': maintenant}, synchronize_session=False)
+
+    candidats = [entree_id for (entree_id,) in db.session.query(SyncOutbox.id).filter(
+        SyncOutbox.statut.in_(['pending', 'failed']),
+        # Les suppressions distantes sont réessayées sans limite : sinon le site garde un orphelin
+        or_(SyncOutbox.tentatives < SYNC_OUTBOX_MAX_TENTATIVES, SyncOutbox.action == 'delete'),
+        SyncOutbox.prochain_essai <= maintenant
+    ).order_by(SyncOutbox.id).limit(limite)]
+    db.session.commit()
+
+    reservees = []
+    for entree_id in candidats:
+        # Réservation atomique : une seule instance gunicorn traite l'entrée
+        reservee = SyncOutbox.query.filter(
+            SyncOutbox.id == entree_id,
+            SyncOutbox.statut.in_(['pending', 'failed'])
+        ).update({'statut': 'processing', 'date_modification': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if reservee:
+            reservees.append(entree_id)
+
+    # Groupes traités ensemble : les synchronisations d'un même modèle forment un lot
+    # quand le site principal accepte les lots, le reste est traité entrée par entrée
+    lots_actifs = capacites_lot() is not None
+    groupes, lots = [], {}
+    for entree in sorted(SyncOutbox.query.filter(SyncOutbox.id.in_(reservees)), key=lambda e: e.id):
+        if lots_actifs and entree.action == 'sync':
+            if entree.modele not in lots:
+                lots[entree.modele] = []
+                groupes.append(lots[entree.modele])
+            lots[entree.modele].append(entree.id)
+        else:
+            groupes.append([entree.id])
+
+    traitees = 0
+    for position, groupe in enumerate(groupes):
+        entrees = [db.session.get(SyncOutbox, entree_id) for entree_id in groupe]
+        try:
+            if lots_actifs and entrees[0].action == 'sync':
+                resultats = executer_lot_entrees(entrees[0].modele, entrees)
+            else:
+                resultats = [executer_entree(entrees[0])]
+        except Exception as e:
+            db.session.rollback()
+            entrees = [db.session.get(SyncOutbox, entree_id) for entree_id in groupe]
+            resultats = [(False, f"Erreur inattendue: {str(e)}")] * len(entrees)
+
+        panne = disjoncteur_site.est_ouvert
+        for entree, (success, message) in zip(entrees, resultats):
+            entree.message = message
+            if not success and panne:
+                # Panne du site principal : remettre l'entrée en attente sans compter de tentative
+                entree.statut = 'pending'
+                entree.prochain_essai = datetime.utcnow() + timedelta(seconds=CIRCUIT_DUREE_OUVERTURE)
+                continue
+            entree.tentatives = (entree.tentatives or 0) + 1
+            if success:
+                entree.statut = 'ok'
+            else:
+                entree.statut = 'failed'
+                delai = delai_essai(entree.action, entree.tentatives)
+                entree.prochain_essai = datetime.utcnow() + timedelta(seconds=delai)
+            traitees += 1
+        
+        if panne and not all(success for success, _ in resultats):
+            # Les groupes suivants, réservés mais non tentés, sont rendus à la file d'attente
+            restantes = [entree_id for suivant in groupes[position + 1:] for entree_id in suivant]
+            if restantes:
+                SyncOutbox.query.filter(SyncOutbox.id.in_(restantes)).update(
+                    {'statut': 'pending', 'date_modification': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            break
+        db.session.commit()
+
+    return traitees
+
+def delai_essai(action, tentatives):
+    """Délai avant le prochain essai après `tentatives` échecs (plafonné pour les suppressions)"""
+    delai = SYNC_OUTBOX_DELAI_ESSAI * (tentatives or 1)
+    return min(delai, SYNC_SUPPRESSION_DELAI_MAX) if action == 'delete' else delai
+
+def purger_suppressions(immediat=False, taille=SYNC_BATCH_SIZE):
+    """Réessaie en lot les suppressions distantes en attente, avec une concurrence bornée.
+    
+    Une suppression reste dans la file d'attente tant que le site principal ne l'a pas confirmée ;
+    les suppressions confirmées sont soldées en une seule requête par lot. Retourne (confirmées, échecs).
+    """
+    confirmees = echecs = 0
+    dernier = 0
+    while not disjoncteur_site.est_ouvert:
+        maintenant = datetime.utcnow()
+        condition = and_(SyncOutbox.id > dernier, SyncOutbox.action == 'delete',
+                         SyncOutbox.statut.in_(['pending', 'failed']))
+        if not immediat:
+            condition = and_(condition, SyncOutbox.prochain_essai <= maintenant)
+        ids = db.session.scalars(select(SyncOutbox.id).where(condition).order_by(SyncOutbox.id).limit(taille)).all()
+        if not ids:
+            break
+        dernier = ids[-1]
+        
+        # Réservation atomique du lot : seules les entrées encore libres sont retournées
+        reservees = db.session.execute(
+            update(SyncOutbox).where(SyncOutbox.id.in_(ids), SyncOutbox.statut.in_(['pending', 'failed']))
+            .values(statut='processing', date_modification=maintenant)
+            .returning(SyncOutbox.id, SyncOutbox.modele, SyncOutbox.sync_id, SyncOutbox.tentatives)
+        ).all()
+        db.session.commit()
+        
+        with ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY) as executor:
+            futures = {executor.submit(delete_from_site, modele, sync_id): (entree_id, tentatives or 0)
+                       for entree_id, modele, sync_id, tentatives in reservees}
+            resultats = [(*futures[future], *future.result()) for future in as_completed(futures)]
+        
+        maintenant = datetime.utcnow()
+        panne = disjoncteur_site.est_ouvert
+        soldees = [entree_id for entree_id, _, success, _ in resultats if success]
+        if soldees:
+            db.session.execute(
+                update(SyncOutbox).where(SyncOutbox.id.in_(soldees))
+                .values(statut='ok', tentatives=SyncOutbox.tentatives + 1, date_modification=maintenant,
+                        message="Suppression confirmée par le site principal")
+            )
+        a_reprendre = []
+        for entree_id, tentatives, success, message in resultats:
+            if success:
+                continue
+            if panne or message == MESSAGE_DISJONCTEUR:
+                # Panne du site principal, ou appel refusé pendant l'essai du disjoncteur semi-ouvert :
+                # remettre l'entrée en attente sans compter de tentative
+                delai = CIRCUIT_DUREE_OUVERTURE if panne else 0
+                a_reprendre.append({'b_id': entree_id, 'b_statut': 'pending', 'b_tentatives': tentatives,
+                                    'b_message': message, 'b_essai': maintenant + timedelta(seconds=delai)})
+            else:
+                echecs += 1
+                a_reprendre.append({'b_id': entree_id, 'b_statut': 'failed', 'b_tentatives': tentatives + 1,
+                                    'b_message': message,
+                                    'b_essai': maintenant + timedelta(seconds=delai_essai('delete', tentatives + 1))})
+        if a_reprendre:
+            db.session.connection().execute(
+                update(SyncOutbox).where(SyncOutbox.id == bindparam('b_id')).values(
+                    statut=bindparam('b_statut'), tentatives=bindparam('b_tentatives'),
+                    message=bindparam('b_message'), prochain_essai=bindparam('b_essai'),
+                    date_modification=maintenant),
+                a_reprendre
+            )
+        db.session.commit()
+        confirmees += len(soldees)
+    
+    return confirmees, echecs
+
+def purger_outbox():
+    """Supprime les entrées traitées avec succès au-delà de la durée de rétention"""
+    limite = datetime.utcnow() - timedelta(days=SYNC_OUTBOX_RETENTION_JOURS)
+    SyncOutbox.query.filter(
+        SyncOutbox.statut == 'ok',
+        SyncOutbox.date_modification < limite
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+def boucle_worker_sync():
+    """Boucle du worker de synchronisation en arrière-plan"""
+    while True:
+        _reveil_worker.wait(SYNC_WORKER_INTERVAL)
+        _reveil_worker.clear()
+        with app.app_context():
+            try:
+                while traiter_outbox():
+                    pass
+                purger_outbox()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erreur du worker de synchronisation: {str(e)}")
+
+def demarrer_thread_fond(nom, cible):
+    """Démarre un thread d'arrière-plan une fois par processus (y compris après un fork gunicorn)"""
+    if _threads_fond.get(nom) == os.getpid():
+        return
+    with _threads_lock:
+        if _threads_fond.get(nom) == os.getpid():
+            return
+        threading.Thread(target=cible, name=nom, daemon=True).start()
+        _threads_fond[nom] = os.getpid()
+
+def demarrer_worker_sync():
+    """Démarre le worker de synchronisation s'il est activé"""
+    if SYNC_WORKER_ENABLED:
+        demarrer_thread_fond('sync-worker', boucle_worker_sync)
+
+def reveiller_worker_sync():
+    """Réveille le worker après un commit contenant de nouvelles entrées"""
+    _reveil_worker.set()
+
+def etats_sync(modele, ids):
+    """Retourne la dernière entrée de la file d'attente pour chaque id"""
+    if not ids:
+        return {}
+    dernieres = db.session.query(func.max(SyncOutbox.id)).filter(
+        SyncOutbox.modele == modele,
+        SyncOutbox.objet_id.in_(ids)
+    ).group_by(SyncOutbox.objet_id)
+    entrees = SyncOutbox.query.filter(SyncOutbox.id.in_(dernieres)).all()
+    return {entree.objet_id: entree for entree in entrees}
+
+# --- ÉCHÉANCES (EXPIRATION ET PUBLICATION PROGRAMMÉE) ---
+
+def desactiver_expires(modele, condition):
+    """Désactive en une requête les éléments actifs expirés et planifie leur retrait du site"""
+    Modele = MODELES[modele]
+    expires = db.session.execute(
+        select(Modele.id, Modele.sync_id).where(Modele.est_active == True, condition)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not expires:
+        return 0
+    
+    ids = [objet_id for objet_id, _ in expires]
+    db.session.execute(
+        update(Modele).where(Modele.id.in_(ids))
+        .values(est_active=False, sync_id=None, sync_hash=None, date_modification=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    journaliser(modele, ids)
+    planifier_suppressions(modele, [(objet_id, sync_id) for objet_id, sync_id in expires if sync_id])
+    return len(ids)
+
+def publier_annonces_programmees(maintenant):
+    """Planifie la synchronisation des annonces dont la date de début est arrivée"""
+    # Une synchronisation déjà planifiée après la date de début : rien à faire
+    deja_planifiee = select(SyncOutbox.id).where(
+        SyncOutbox.modele == 'annonce', SyncOutbox.objet_id == Annonce.id,
+        SyncOutbox.action == 'sync', SyncOutbox.date_creation >= Annonce.date_debut
+    ).exists()
+    ids = db.session.scalars(select(Annonce.id).where(
+        Annonce.est_active == True, Annonce.sync_id == None, Annonce.date_debut <= maintenant,
+        or_(Annonce.date_fin == None, Annonce.date_fin > maintenant), ~deja_planifiee
+    ).with_for_update(skip_locked=True)).all()
+    # Entrée dans le journal : l'annonce apparaît dans le flux /api/changes
+    journaliser('annonce', ids)
+    planifier_syncs('annonce', ids)
+    return len(ids)
+
+# Clé du verrou consultatif Postgres : une seule passe du planificateur à la fois, tous workers confondus
+VERROU_ECHEANCES = 7410003
+
+def appliquer_echeances():
+    """Une passe du planificateur, en une seule transaction ; retourne les nombres d'éléments traités"""
+    maintenant = datetime.utcnow()
+    if db.session.connection().dialect.name == 'postgresql':
+        # Une autre passe en cours ne verrait pas nos entrées non validées : on lui laisse la main
+        if not db.session.execute(text("SELECT pg_try_advisory_xact_lock(:cle)"),
+                                  {'cle': VERROU_ECHEANCES}).scalar():
+            db.session.rollback()
+            return {'annonces_expirees': 0, 'offres_expirees': 0, 'annonces_publiees': 0}
+    resultat = {
+        'annonces_expirees': desactiver_expires('annonce', Annonce.date_fin <= maintenant),
+        'offres_expirees': desactiver_expires('offre', Offre.date_limite < maintenant.date()),
+        'annonces_publiees': publier_annonces_programmees(maintenant)
+    }
+    db.session.commit()
+    if any(resultat.values()):
+        reveiller_worker_sync()
+    return resultat
+
+def boucle_echeances():
+    """Applique périodiquement les échéances en arrière-plan"""
+    while True:
+        with app.app_context():
+            try:
+                appliquer_echeances()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Erreur du planificateur d'échéances: {str(e)}")
+        time.sleep(ECHEANCES_INTERVAL)
+
+@app.cli.command('appliquer-echeances')
+def appliquer_echeances_commande():
+    """Désactive les annonces/offres expirées et publie les annonces programmées"""
+    resultat = appliquer_echeances()
+    print(f"Annonces expirées : {resultat['annonces_expirees']}")
+    print(f"Offres expirées : {resultat['offres_expirees']}")
+    print(f"Annonces publiées : {resultat['annonces_publiees']}")
+
+@app.cli.command('purger-suppressions')
+@click.option('--immediat', is_flag=True, help="Réessayer sans attendre le délai entre deux essais")
+def purger_suppressions_commande(immediat):
+    """Réessaie les suppressions distantes en attente jusqu'à confirmation par le site principal"""
+    confirmees, echecs = purger_suppressions(immediat=immediat)
+    restantes = SyncOutbox.query.filter(SyncOutbox.action == 'delete', SyncOutbox.statut != 'ok').count()
+    print(f"Suppressions confirmées : {confirmees}")
+    print(f"Échecs : {echecs}")
+    print(f"Suppressions encore en attente : {restantes}")
+
+# --- ÉTAT DU SITE PRINCIPAL ---
+
+_sante_site = {'connecte': False, 'message': 'Vérification en cours', 'verifie_le': None}
+_sante_lock = threading.Lock()
+
+def verifier_site():
+    """Interroge /api/health du site principal et met à jour le cache"""
+    try:
+        response = site_http.get(f"{SITE_URL}/api/health", timeout=5)
+        connecte = response.status_code == 200
+        message = None if connecte else f"Erreur HTTP {response.status_code}"
+    except Exception:
+        connecte, message = False, 'Site inaccessible'
+    with _sante_lock:
+        _sante_site.update(connecte=connecte, message=message, verifie_le=time.monotonic())
+
+def etat_site():
+    """Retourne l'état du site principal depuis le cache, sans appel réseau"""
+    with _sante_lock:
+        etat = dict(_sante_site)
+    if etat['verifie_le'] is not None and time.monotonic() - etat['verifie_le'] > 3 * HEALTH_CACHE_TTL:
+        etat.update(connecte=False, message='État du site inconnu (sonde en retard)')
+    return etat
+
+def boucle_sonde_sante():
+    """Rafraîchit périodiquement l'état de santé du site principal"""
+    while True:
+        verifier_site()
+        time.sleep(HEALTH_CACHE_TTL)
+
+@app.before_request
+def lancer_threads_fond():
+    demarrer_worker_sync()
+    demarrer_thread_fond('sonde-sante', boucle_sonde_sante)
+    if ECHEANCES_ENABLED:
+        demarrer_thread_fond('echeances', boucle_echeances)
+
+# --- SYNCHRONISATION PARALLÈLE ---
+
+def _sync_elements(modele, ids):
+    """Synchronise des éléments depuis un thread du pool (contexte applicatif dédié)"""
+    with app.app_context():
+        Modele = MODELES[modele]
+        objets = {objet.id: objet for objet in Modele.query.options(undefer_group('texte')).filter(Modele.id.in_(ids))}
+        presents = [objets[objet_id] for objet_id in ids if objet_id in objets]
+        resultats = dict(zip([objet.id for objet in presents], sync_lot(modele, presents)))
+        return [resultats.get(objet_id, (False, "Élément introuvable")) for objet_id in ids]
+
+def iterer_ids_par_tranches(modele, taille, condition=None):
+    """Parcourt les ids d'une table par tranches, en pagination par clé (aucun curseur ouvert entre deux commits)"""
+    Modele = MODELES[modele]
+    dernier = 0
+    while True:
+        requete = select(Modele.id).where(Modele.id > dernier)
+        if condition is not None:
+            requete = requete.where(condition)
+        ids = db.session.scalars(requete.order_by(Modele.id).limit(taille)).all()
+        if not ids:
+            return
+        yield ids
+        dernier = ids[-1]
+
+def _comptabiliser(resume, modele, ids, future):
+    try:
+        resultats = future.result()
+    except Exception as e:
+        resultats = [(False, f"Erreur inattendue: {str(e)}")] * len(ids)
+    for objet_id, (success, message) in zip(ids, resultats):
+        if success:
+            resume[modele]['succes'] += 1
+        else:
+            resume[modele]['echecs'] += 1
+            if len(resume[modele]['erreurs']) < 100:
+                resume[modele]['erreurs'].append({'id': objet_id, 'message': message})
+
+def synchroniser_en_parallele(tranches):
+    """Synchronise des tranches (modèle, ids) avec une concurrence bornée et retourne un résumé par modèle"""
+    resume = {modele: {'succes': 0, 'echecs': 0, 'erreurs': []} for modele in MODELES}
+    with ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY) as executor:
+        en_cours = {}
+        for modele, ids in tranches:
+            # Tranches en vol bornées : la mémoire ne dépend pas de la taille des tables
+            if len(en_cours) >= 2 * SYNC_CONCURRENCY:
+                terminees, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+                for future in terminees:
+                    _comptabiliser(resume, *en_cours.pop(future), future)
+            en_cours[executor.submit(_sync_elements, modele, ids)] = (modele, ids)
+        for future in as_completed(en_cours):
+            _comptabiliser(resume, *en_cours[future], future)
+    return resume
+
+# --- IMAGES TÉLÉVERSÉES (STOCKAGE PAR EMPREINTE) ---
+
+_pool_images = {'pid': None, 'executeur': None}
+_pool_images_lock = threading.Lock()
+
+def pool_images():
+    """Pool de processus pour le redimensionnement, créé une fois par processus"""
+    if _pool_images['pid'] != os.getpid():
+        with _pool_images_lock:
+            if _pool_images['pid'] != os.getpid():
+                # 'spawn' : les processus n'héritent ni des threads ni des connexions ouvertes
+                _pool_images['executeur'] = ProcessPoolExecutor(
+                    max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn')
+                )
+                _pool_images['pid'] = os.getpid()
+    return _pool_images['executeur']
+
+def dossier_image(empreinte):
+    return os.path.join(app.config['UPLOAD_FOLDER'], empreinte[:2], empreinte)
+
+def chemin_original(empreinte):
+    """Retourne le chemin du fichier original d'une image, ou None"""
+    dossier = dossier_image(empreinte)
+    if os.path.isdir(dossier):
+        for nom in os.listdir(dossier):
+            if nom.startswith('original.'):
+                return os.path.join(dossier, nom)
+    return None
+
+def _journaliser_variantes(future):
+    if future.exception():
+        app.logger.error(f"Erreur génération des variantes d'image: {future.exception()}")
+
+def planifier_variantes(empreinte):
+    """Lance la génération des variantes manquantes hors du thread de la requête"""
+    if images.Image is None:
+        return
+    dossier = dossier_image(empreinte)
+    if all(os.path.exists(images.chemin_variante(dossier, v)) for v in images.VARIANTES):
+        return
+    future = pool_images().submit(images.generer_variantes, chemin_original(empreinte), dossier)
+    future.add_done_callback(_journaliser_variantes)
+
+def stocker_image(fichier):
+    """Enregistre un fichier téléversé sous son empreinte SHA-256 (un seul exemplaire par contenu)"""
+    extension = fichier.filename.rsplit('.', 1)[-1].lower() if '.' in fichier.filename else ''
+    if extension not in EXTENSIONS_IMAGES:
+        raise ValueError(f"Format d'image non supporté ({', '.join(sorted(EXTENSIONS_IMAGES))})")
+    
+    # Copie en flux vers un fichier temporaire tout en calculant l'empreinte
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    empreinte = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=app.config['UPLOAD_FOLDER'], delete=False) as temporaire:
+        while True:
+            bloc = fichier.stream.read(64 * 1024)
+            if not bloc:
+                break
+            empreinte.update(bloc)
+            temporaire.write(bloc)
+    empreinte = empreinte.hexdigest()
+    
+    if chemin_original(empreinte):
+        os.remove(temporaire.name)  # contenu déjà stocké
+    else:
+        os.makedirs(dossier_image(empreinte), exist_ok=True)
+        shutil.move(temporaire.name, os.path.join(dossier_image(empreinte), f"original.{extension}"))
+    planifier_variantes(empreinte)
+    return empreinte
+
+def url_media(empreinte, variante='web'):
+    """URL absolue d'une variante, telle qu'envoyée au site principal"""
+    if MEDIA_BASE_URL:
+        return MEDIA_BASE_URL + url_for('media', empreinte=empreinte, variante=variante)
+    return url_for('media', empreinte=empreinte, variante=variante, _external=True)
+
+def image_formulaire():
+    """Image d'un formulaire : fichier téléversé en priorité, sinon URL saisie"""
+    fichier = request.files.get('image')
+    if fichier and fichier.filename:
+        return url_media(stocker_image(fichier))
+    return request.form.get('image_url')
+
+@app.route('/media/<empreinte>/<variante>')
+def media(empreinte, variante):
+    """Sert une variante d'image, ou l'original tant qu'elle n'est pas générée"""
+    if not re.fullmatch(r'[0-9a-f]{64}', empreinte) or (variante not in images.VARIANTES and variante != 'original'):
+        abort(404)
+    original = chemin_original(empreinte)
+    if not original:
+        abort(404)
+    
+    if variante != 'original':
+        chemin = images.chemin_variante(dossier_image(empreinte), variante)
+        if os.path.exists(chemin):
+            return send_file(os.path.abspath(chemin), mimetype='image/webp', max_age=365 * 24 * 3600)
+        planifier_variantes(empreinte)
+        # Repli temporaire : ne pas le mettre en cache longtemps
+        return send_file(os.path.abspath(original), max_age=60)
+    return send_file(os.path.abspath(original), max_age=365 * 24 * 3600)
+
 # --- ROUTES AUTHENTIFICATION ---
 
 @app.route('/')
@@ -341,38 +2123,161 @@ def logout():
 
 # --- ROUTES DASHBOARD ---
 
+def _somme_si(condition):
+    """Somme conditionnelle (nombre de lignes vérifiant la condition)"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def statistiques_contenu():
+    """Calcule tous les compteurs du tableau de bord en un seul aller-retour SQL"""
+    activites = db.session.query(
+        func.count(Activite.id).label('total'),
+        _somme_si(Activite.est_publie == True).label('publiees')
+    ).subquery()
+    realisations = db.session.query(
+        func.count(Realisation.id).label('total'),
+        _somme_si(and_(Realisation.image_url != None, Realisation.image_url != '')).label('avec_images')
+    ).subquery()
+    annonces = db.session.query(
+        func.count(Annonce.id).label('total'),
+        _somme_si(Annonce.est_active == True).label('actives')
+    ).subquery()
+    offres = db.session.query(
+        func.count(Offre.id).label('total'),
+        _somme_si(Offre.est_active == True).label('actives')
+    ).subquery()
+    
+    # Chaque sous-requête renvoie une seule ligne : la jointure produit une seule ligne
+    ligne = db.session.query(
+        activites.c.total, activites.c.publiees,
+        realisations.c.total, realisations.c.avec_images,
+        annonces.c.total, annonces.c.actives,
+        offres.c.total, offres.c.actives
+    ).select_from(activites).join(realisations, true()).join(annonces, true()).join(offres, true()).one()
+    
+    return {
+        'activities_count': ligne[0],
+        'activities_published': ligne[1],
+        'realisations_count': ligne[2],
+        'realisations_with_images': ligne[3],
+        'annonces_count': ligne[4],
+        'annonces_active': ligne[5],
+        'offres_count': ligne[6],
+        'offres_active': ligne[7]
+    }
+
 @app.route('/dashboard')
 @login_required
+@page_en_cache(*MODELES, 'sync', cle_supplementaire=lambda: etat_site()['connecte'])
+@lecture_replica
 def dashboard():
-    stats = {
-        'activities_count': Activite.query.count(),
-        'realisations_count': Realisation.query.count(),
-        'annonces_count': Annonce.query.count(),
-        'offres_count': Offre.query.count(),
-        'activities_published': Activite.query.filter_by(est_publie=True).count(),
-        'annonces_active': Annonce.query.filter_by(est_active=True).count(),
-        'offres_active': Offre.query.filter_by(est_active=True).count()
-    }
+    stats = statistiques_contenu()
     
-    # Vérification de la connexion au site principal
-    try:
-        response = requests.get(f"{SITE_URL}/api/health", timeout=5)
-        stats['site_connected'] = response.status_code == 200
-    except:
-        stats['site_connected'] = False
+    # État du site principal servi depuis le cache de la sonde
+    sante = etat_site()
+    stats['site_connected'] = sante['connecte']
+    stats['site_message'] = sante['message']
+    
+    # Dernières entrées : seules les colonnes affichées sont lues
+    recent_activities = db.session.execute(
+        select(Activite.id, Activite.titre, Activite.auteur, Activite.est_publie, Activite.date_creation)
+        .order_by(Activite.date_creation.desc(), Activite.id.desc()).limit(5)
+    ).all()
+    recent_annonces = db.session.execute(
+        select(Annonce.id, Annonce.titre, Annonce.type_annonce, Annonce.est_active, Annonce.date_creation)
+        .order_by(Annonce.date_creation.desc(), Annonce.id.desc()).limit(5)
+    ).all()
     
     return render_template('dashboard.html', 
                           stats=stats, 
+                          recent_activities=recent_activities,
+                          recent_annonces=recent_annonces,
                           now=datetime.utcnow(),
                           site_url=SITE_URL)
 
+# --- FILTRES ET STATISTIQUES DES LISTES ---
+
+# Filtres de chaque page de liste : paramètres de l'URL, appliqués en SQL à toutes les pages
+FILTRES_LISTES = {
+    'annonce': ('type', 'statut', 'q'),
+    'offre': ('type', 'statut', 'lieu', 'q')
+}
+
+def _contient(colonnes, terme):
+    """Condition SQL : le terme apparaît dans l'une des colonnes, sans tenir compte de la casse"""
+    terme = terme.lower()
+    return or_(*(func.lower(colonne).contains(terme, autoescape=True) for colonne in colonnes))
+
+def filtres_liste(modele):
+    """Lit les filtres d'une page de liste ; retourne (valeurs retenues, conditions SQL)"""
+    filtres = {cle: request.args[cle].strip() for cle in FILTRES_LISTES.get(modele, ())
+               if request.args.get(cle, '').strip()}
+    conditions = []
+    if modele == 'annonce':
+        if 'type' in filtres:
+            conditions.append(Annonce.type_annonce == filtres['type'])
+        if filtres.get('statut') in ('active', 'inactive'):
+            conditions.append(Annonce.est_active == (filtres['statut'] == 'active'))
+        if 'q' in filtres:
+            conditions.append(_contient((Annonce.titre, Annonce.contenu), filtres['q']))
+    elif modele == 'offre':
+        aujourd_hui = datetime.utcnow().date()
+        if 'type' in filtres:
+            conditions.append(Offre.type_offre == filtres['type'])
+        if filtres.get('statut') == 'active':
+            conditions.append(and_(Offre.est_active == True,
+                                   or_(Offre.date_limite == None, Offre.date_limite >= aujourd_hui)))
+        elif filtres.get('statut') == 'expired':
+            conditions.append(and_(Offre.est_active == True, Offre.date_limite < aujourd_hui))
+        elif filtres.get('statut') == 'inactive':
+            conditions.append(Offre.est_active == False)
+        if 'lieu' in filtres:
+            conditions.append(Offre.lieu == filtres['lieu'])
+        if 'q' in filtres:
+            conditions.append(_contient((Offre.titre,), filtres['q']))
+    return filtres, conditions
+
+def statistiques_liste(modele):
+    """Compteurs des cartes d'une page de liste, sur toute la table, en un seul aller-retour SQL"""
+    if modele == 'annonce':
+        colonnes = {
+            'total': func.count(Annonce.id),
+            'urgentes': _somme_si(Annonce.type_annonce == 'urgence'),
+            'actives': _somme_si(Annonce.est_active == True),
+            'evenements': _somme_si(Annonce.type_annonce == 'evenement')
+        }
+    elif modele == 'offre':
+        colonnes = {
+            'total': func.count(Offre.id),
+            'emplois': _somme_si(Offre.type_offre == 'emploi'),
+            'stages': _somme_si(Offre.type_offre == 'stage'),
+            'formations': _somme_si(Offre.type_offre == 'formation')
+        }
+    elif modele == 'realisation':
+        colonnes = {
+            'total': func.count(Realisation.id),
+            'cette_annee': _somme_si(Realisation.date_creation >= datetime(datetime.utcnow().year, 1, 1)),
+            'avec_images': _somme_si(and_(Realisation.image_url != None, Realisation.image_url != '')),
+            'categories': func.count(func.distinct(func.nullif(Realisation.categorie, '')))
+        }
+    else:
+        colonnes = {'total': func.count(MODELES[modele].id)}
+    ligne = db.session.execute(select(*(colonne.label(nom) for nom, colonne in colonnes.items()))).one()
+    return dict(ligne._mapping)
+
 # --- ROUTES ACTIVITÉS ---
 
 @app.route('/activites')
 @login_required
+@page_en_cache('activite', 'sync')
+@lecture_replica
 def activites():
-    activites_list = Activite.query.order_by(Activite.date_creation.desc()).all()
-    return render_template('activites.html', activites=activites_list)
+    pagination = paginer_keyset(avec_extrait('activite', Activite.query), Activite)
+    activites_list = pagination['elements']
+    return render_template('activites.html',
+                          activites=activites_list,
+                          pagination=pagination,
+                          now=datetime.utcnow(),
+                          sync_states=etats_sync('activite', [item.id for item in activites_list]))
 
 @app.route('/activite/nouveau', methods=['GET', 'POST'])
 @login_required
@@ -385,20 +2290,20 @@ def nouvel_activite():
                 titre=request.form.get('titre'),
                 description=request.form.get('description'),
                 contenu=request.form.get('contenu'),
-                image_url=request.form.get('image_url'),
+                image_url=image_formulaire(),
                 auteur=session.get('username', 'Admin'),
                 est_publie=est_publie
             )
             db.session.add(nouvelle)
+            
+            # Synchroniser avec le site principal si publié (via la file d'attente)
+            if est_publie:
+                planifier_sync('activite', nouvelle)
             db.session.commit()
+            reveiller_worker_sync()
             
-            # Synchroniser avec le site principal si publié
             if est_publie:
-                success, message = sync_activite(nouvelle)
-                if success:
-                    flash(f'Activité créée et synchronisée avec le site!', 'success')
-                else:
-                    flash(f'Activité créée mais erreur de synchronisation: {message}', 'warning')
+                flash('Activité créée, synchronisation avec le site en cours', 'success')
             else:
                 flash('Activité créée (non publiée)!', 'success')
                 
@@ -412,7 +2317,7 @@ def nouvel_activite():
 @app.route('/activite/<int:id>/modifier', methods=['GET', 'POST'])
 @login_required
 def modifier_activite(id):
-    activite = Activite.query.get_or_404(id)
+    activite = Activite.query.options(undefer_group('texte')).get_or_404(id)
     
     if request.method == 'POST':
         try:
@@ -420,30 +2325,24 @@ def modifier_activite(id):
             activite.titre = request.form.get('titre')
             activite.description = request.form.get('description')
             activite.contenu = request.form.get('contenu')
-            activite.image_url = request.form.get('image_url')
+            activite.image_url = image_formulaire()
             activite.est_publie = request.form.get('est_publie') == 'true'
             activite.date_modification = datetime.utcnow()
             
-            db.session.commit()
-            
-            # Synchroniser avec le site principal
+            # Synchroniser avec le site principal (via la file d'attente)
             if activite.est_publie:
-                success, message = sync_activite(activite)
-                if success:
-                    flash(f'Activité mise à jour et synchronisée!', 'success')
-                else:
-                    flash(f'Activité mise à jour mais erreur de synchronisation: {message}', 'warning')
+                planifier_sync('activite', activite)
+                db.session.commit()
+                flash('Activité mise à jour, synchronisation en cours', 'success')
             elif ancien_etat and not activite.est_publie and activite.sync_id:
                 # Si on dépublie, supprimer du site
-                success, message = delete_from_site('activite', activite.sync_id)
-                if success:
-                    activite.sync_id = None
-                    db.session.commit()
-                    flash('Activité dépublée et retirée du site', 'info')
-                else:
-                    flash(f'Activité dépublée mais erreur de retrait du site: {message}', 'warning')
+                planifier_suppression('activite', activite)
+                db.session.commit()
+                flash('Activité dépublée, retrait du site en cours', 'info')
             else:
+                db.session.commit()
                 flash('Activité mise à jour (non publiée)!', 'success')
+            reveiller_worker_sync()
                 
             return redirect(url_for('activites'))
         except Exception as e:
@@ -457,13 +2356,13 @@ def modifier_activite(id):
 def supprimer_activite(id):
     activite = Activite.query.get_or_404(id)
     try:
-        # Supprimer du site principal d'abord
-        if activite.sync_id:
-            delete_from_site('activite', activite.sync_id)
+        # Retrait du site principal via la file d'attente, dans la même transaction
+        planifier_suppression('activite', activite)
         
         # Supprimer de la base locale
         db.session.delete(activite)
         db.session.commit()
+        reveiller_worker_sync()
         flash('Activité supprimée avec succès!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -474,9 +2373,9 @@ def supprimer_activite(id):
 @app.route('/activite/<int:id>/sync', methods=['POST'])
 @login_required
 def sync_activite_route(id):
-    activite = Activite.query.get_or_404(id)
+    activite = Activite.query.options(undefer_group('texte')).get_or_404(id)
     if activite.est_publie:
-        success, message = sync_activite(activite)
+        success, message = sync_activite(activite, force=True)
         if success:
             flash(message, 'success')
         else:
@@ -489,9 +2388,17 @@ def sync_activite_route(id):
 
 @app.route('/realisations')
 @login_required
+@page_en_cache('realisation', 'sync')
+@lecture_replica
 def realisations():
-    realisations_list = Realisation.query.order_by(Realisation.date_creation.desc()).all()
-    return render_template('realisations.html', realisations=realisations_list)
+    pagination = paginer_keyset(avec_extrait('realisation', Realisation.query), Realisation)
+    realisations_list = pagination['elements']
+    return render_template('realisations.html',
+                          realisations=realisations_list,
+                          pagination=pagination,
+                          stats=statistiques_liste('realisation'),
+                          now=datetime.utcnow(),
+                          sync_states=etats_sync('realisation', [item.id for item in realisations_list]))
 
 @app.route('/realisation/nouveau', methods=['GET', 'POST'])
 @login_required
@@ -505,19 +2412,17 @@ def nouvelle_realisation():
             nouvelle = Realisation(
                 titre=request.form.get('titre'),
                 description=request.form.get('description'),
-                image_url=request.form.get('image_url'),
+                image_url=image_formulaire(),
                 categorie=request.form.get('categorie'),
                 date_realisation=date_realisation
             )
             db.session.add(nouvelle)
-            db.session.commit()
             
-            # Synchroniser avec le site principal
-            success, message = sync_realisation(nouvelle)
-            if success:
-                flash(f'Réalisation créée et synchronisée avec le site!', 'success')
-            else:
-                flash(f'Réalisation créée mais erreur de synchronisation: {message}', 'warning')
+            # Synchroniser avec le site principal (via la file d'attente)
+            planifier_sync('realisation', nouvelle)
+            db.session.commit()
+            reveiller_worker_sync()
+            flash('Réalisation créée, synchronisation avec le site en cours', 'success')
                 
             return redirect(url_for('realisations'))
         except Exception as e:
@@ -529,13 +2434,13 @@ def nouvelle_realisation():
 @app.route('/realisation/<int:id>/modifier', methods=['GET', 'POST'])
 @login_required
 def modifier_realisation(id):
-    realisation = Realisation.query.get_or_404(id)
+    realisation = Realisation.query.options(undefer_group('texte')).get_or_404(id)
     
     if request.method == 'POST':
         try:
             realisation.titre = request.form.get('titre')
             realisation.description = request.form.get('description')
-            realisation.image_url = request.form.get('image_url')
+            realisation.image_url = image_formulaire()
             realisation.categorie = request.form.get('categorie')
             
             if request.form.get('date_realisation'):
@@ -543,14 +2448,11 @@ def modifier_realisation(id):
             else:
                 realisation.date_realisation = None
             
+            # Synchroniser avec le site principal (via la file d'attente)
+            planifier_sync('realisation', realisation)
             db.session.commit()
-            
-            # Synchroniser avec le site principal
-            success, message = sync_realisation(realisation)
-            if success:
-                flash(f'Réalisation mise à jour et synchronisée!', 'success')
-            else:
-                flash(f'Réalisation mise à jour mais erreur de synchronisation: {message}', 'warning')
+            reveiller_worker_sync()
+            flash('Réalisation mise à jour, synchronisation en cours', 'success')
                 
             return redirect(url_for('realisations'))
         except Exception as e:
@@ -564,12 +2466,12 @@ def modifier_realisation(id):
 def supprimer_realisation(id):
     realisation = Realisation.query.get_or_404(id)
     try:
-        # Supprimer du site principal d'abord
-        if realisation.sync_id:
-            delete_from_site('realisation', realisation.sync_id)
+        # Retrait du site principal via la file d'attente, dans la même transaction
+        planifier_suppression('realisation', realisation)
         
         db.session.delete(realisation)
         db.session.commit()
+        reveiller_worker_sync()
         flash('Réalisation supprimée avec succès!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -581,9 +2483,19 @@ def supprimer_realisation(id):
 
 @app.route('/annonces')
 @login_required
+@page_en_cache('annonce', 'sync')
+@lecture_replica
 def annonces():
-    annonces_list = Annonce.query.order_by(Annonce.date_creation.desc()).all()
-    return render_template('annonces.html', annonces=annonces_list)
+    filtres, conditions = filtres_liste('annonce')
+    pagination = paginer_keyset(avec_extrait('annonce', Annonce.query.filter(*conditions)), Annonce)
+    annonces_list = pagination['elements']
+    return render_template('annonces.html',
+                          annonces=annonces_list,
+                          pagination=pagination,
+                          filtres=filtres,
+                          stats=statistiques_liste('annonce'),
+                          now=datetime.utcnow(),
+                          sync_states=etats_sync('annonce', [item.id for item in annonces_list]))
 
 @app.route('/annonce/nouveau', methods=['GET', 'POST'])
 @login_required
@@ -609,15 +2521,17 @@ def nouvelle_annonce():
                 est_active=est_active
             )
             db.session.add(nouvelle)
+            
+            # Synchroniser avec le site principal si active et commencée (via la file d'attente)
+            if est_publiable('annonce', nouvelle):
+                planifier_sync('annonce', nouvelle)
             db.session.commit()
+            reveiller_worker_sync()
             
-            # Synchroniser avec le site principal si active
-            if est_active:
-                success, message = sync_annonce(nouvelle)
-                if success:
-                    flash(f'Annonce créée et synchronisée avec le site!', 'success')
-                else:
-                    flash(f'Annonce créée mais erreur de synchronisation: {message}', 'warning')
+            if est_publiable('annonce', nouvelle):
+                flash('Annonce créée, synchronisation avec le site en cours', 'success')
+            elif est_active:
+                flash(f"Annonce créée, publication programmée le {date_debut.strftime('%d/%m/%Y %H:%M')}", 'success')
             else:
                 flash('Annonce créée (non active)!', 'success')
                 
@@ -631,11 +2545,10 @@ def nouvelle_annonce():
 @app.route('/annonce/<int:id>/modifier', methods=['GET', 'POST'])
 @login_required
 def modifier_annonce(id):
-    annonce = Annonce.query.get_or_404(id)
+    annonce = Annonce.query.options(undefer_group('texte')).get_or_404(id)
     
     if request.method == 'POST':
         try:
-            ancien_etat = annonce.est_active
             annonce.titre = request.form.get('titre')
             annonce.contenu = request.form.get('contenu')
             annonce.type_annonce = request.form.get('type_annonce')
@@ -651,26 +2564,23 @@ def modifier_annonce(id):
             else:
                 annonce.date_fin = None
             
-            db.session.commit()
-            
-            # Synchroniser avec le site principal
-            if annonce.est_active:
-                success, message = sync_annonce(annonce)
-                if success:
-                    flash(f'Annonce mise à jour et synchronisée!', 'success')
-                else:
-                    flash(f'Annonce mise à jour mais erreur de synchronisation: {message}', 'warning')
-            elif ancien_etat and not annonce.est_active and annonce.sync_id:
-                # Si on désactive, supprimer du site
-                success, message = delete_from_site('annonce', annonce.sync_id)
-                if success:
-                    annonce.sync_id = None
-                    db.session.commit()
-                    flash('Annonce désactivée et retirée du site', 'info')
-                else:
-                    flash(f'Annonce désactivée mais erreur de retrait du site: {message}', 'warning')
+            # Synchroniser avec le site principal (via la file d'attente)
+            if est_publiable('annonce', annonce):
+                planifier_sync('annonce', annonce)
+                db.session.commit()
+                flash('Annonce mise à jour, synchronisation en cours', 'success')
+            elif annonce.sync_id:
+                # Si on désactive (ou reporte la date de début), supprimer du site
+                planifier_suppression('annonce', annonce)
+                db.session.commit()
+                flash('Annonce retirée du site, suppression en cours', 'info')
+            elif annonce.est_active:
+                db.session.commit()
+                flash(f"Annonce mise à jour, publication programmée le {annonce.date_debut.strftime('%d/%m/%Y %H:%M')}", 'success')
             else:
+                db.session.commit()
                 flash('Annonce mise à jour (non active)!', 'success')
+            reveiller_worker_sync()
                 
             return redirect(url_for('annonces'))
         except Exception as e:
@@ -684,12 +2594,12 @@ def modifier_annonce(id):
 def supprimer_annonce(id):
     annonce = Annonce.query.get_or_404(id)
     try:
-        # Supprimer du site principal d'abord
-        if annonce.sync_id:
-            delete_from_site('annonce', annonce.sync_id)
+        # Retrait du site principal via la file d'attente, dans la même transaction
+        planifier_suppression('annonce', annonce)
         
         db.session.delete(annonce)
         db.session.commit()
+        reveiller_worker_sync()
         flash('Annonce supprimée avec succès!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -697,13 +2607,40 @@ def supprimer_annonce(id):
     
     return redirect(url_for('annonces'))
 
+@app.route('/annonce/<int:id>/basculer', methods=['POST'])
+@login_required
+def toggle_annonce(id):
+    annonce = Annonce.query.get_or_404(id)
+    try:
+        resultat = action_groupee('annonce', 'depublier' if annonce.est_active else 'publier', [id])[id]
+        flash(f'Annonce : {resultat}', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erreur lors de la mise à jour: {str(e)}', 'danger')
+    
+    return redirect(url_for('annonces'))
+
 # --- ROUTES OFFRES ---
 
 @app.route('/offres')
 @login_required
+@page_en_cache('offre', 'sync')
+@lecture_replica
 def offres():
-    offres_list = Offre.query.order_by(Offre.date_creation.desc()).all()
-    return render_template('offres.html', offres=offres_list)
+    filtres, conditions = filtres_liste('offre')
+    pagination = paginer_keyset(avec_extrait('offre', Offre.query.filter(*conditions)), Offre)
+    offres_list = pagination['elements']
+    lieux = db.session.scalars(
+        select(Offre.lieu).where(Offre.lieu != None, Offre.lieu != '').distinct().order_by(Offre.lieu)
+    ).all()
+    return render_template('offres.html',
+                          offres=offres_list,
+                          pagination=pagination,
+                          filtres=filtres,
+                          lieux=lieux,
+                          stats=statistiques_liste('offre'),
+                          now=datetime.utcnow(),
+                          sync_states=etats_sync('offre', [item.id for item in offres_list]))
 
 @app.route('/offre/nouveau', methods=['GET', 'POST'])
 @login_required
@@ -725,15 +2662,15 @@ def nouvelle_offre():
                 est_active=est_active
             )
             db.session.add(nouvelle)
+            
+            # Synchroniser avec le site principal si active (via la file d'attente)
+            if est_active:
+                planifier_sync('offre', nouvelle)
             db.session.commit()
+            reveiller_worker_sync()
             
-            # Synchroniser avec le site principal si active
             if est_active:
-                success, message = sync_offre(nouvelle)
-                if success:
-                    flash(f'Offre créée et synchronisée avec le site!', 'success')
-                else:
-                    flash(f'Offre créée mais erreur de synchronisation: {message}', 'warning')
+                flash('Offre créée, synchronisation avec le site en cours', 'success')
             else:
                 flash('Offre créée (non active)!', 'success')
                 
@@ -747,7 +2684,7 @@ def nouvelle_offre():
 @app.route('/offre/<int:id>/modifier', methods=['GET', 'POST'])
 @login_required
 def modifier_offre(id):
-    offre = Offre.query.get_or_404(id)
+    offre = Offre.query.options(undefer_group('texte')).get_or_404(id)
     
     if request.method == 'POST':
         try:
@@ -763,26 +2700,20 @@ def modifier_offre(id):
             else:
                 offre.date_limite = None
             
-            db.session.commit()
-            
-            # Synchroniser avec le site principal
+            # Synchroniser avec le site principal (via la file d'attente)
             if offre.est_active:
-                success, message = sync_offre(offre)
-                if success:
-                    flash(f'Offre mise à jour et synchronisée!', 'success')
-                else:
-                    flash(f'Offre mise à jour mais erreur de synchronisation: {message}', 'warning')
+                planifier_sync('offre', offre)
+                db.session.commit()
+                flash('Offre mise à jour, synchronisation en cours', 'success')
             elif ancien_etat and not offre.est_active and offre.sync_id:
                 # Si on désactive, supprimer du site
-                success, message = delete_from_site('offre', offre.sync_id)
-                if success:
-                    offre.sync_id = None
-                    db.session.commit()
-                    flash('Offre désactivée et retirée du site', 'info')
-                else:
-                    flash(f'Offre désactivée mais erreur de retrait du site: {message}', 'warning')
+                planifier_suppression('offre', offre)
+                db.session.commit()
+                flash('Offre désactivée, retrait du site en cours', 'info')
             else:
+                db.session.commit()
                 flash('Offre mise à jour (non active)!', 'success')
+            reveiller_worker_sync()
                 
             return redirect(url_for('offres'))
         except Exception as e:
@@ -796,12 +2727,12 @@ def modifier_offre(id):
 def supprimer_offre(id):
     offre = Offre.query.get_or_404(id)
     try:
-        # Supprimer du site principal d'abord
-        if offre.sync_id:
-            delete_from_site('offre', offre.sync_id)
+        # Retrait du site principal via la file d'attente, dans la même transaction
+        planifier_suppression('offre', offre)
         
         db.session.delete(offre)
         db.session.commit()
+        reveiller_worker_sync()
         flash('Offre supprimée avec succès!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -809,6 +2740,166 @@ def supprimer_offre(id):
     
     return redirect(url_for('offres'))
 
+@app.route('/offre/<int:id>/basculer', methods=['POST'])
+@login_required
+def toggle_offre(id):
+    offre = Offre.query.get_or_404(id)
+    try:
+        resultat = action_groupee('offre', 'depublier' if offre.est_active else 'publier', [id])[id]
+        flash(f'Offre : {resultat}', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erreur lors de la mise à jour: {str(e)}', 'danger')
+    
+    return redirect(url_for('offres'))
+
+# --- ACTIONS GROUPÉES ---
+
+# Colonne de publication de chaque modèle (les réalisations sont toujours publiées)
+COLONNES_PUBLICATION = {'activite': 'est_publie', 'annonce': 'est_active', 'offre': 'est_active'}
+ACTIONS_GROUPEES = ('publier', 'depublier', 'supprimer', 'synchroniser')
+
+def _sans_sync_en_attente(modele, ids):
+    """Retire les éléments qui ont déjà une synchronisation en attente"""
+    if not ids:
+        return []
+    en_attente = set(db.session.scalars(select(SyncOutbox.objet_id).where(
+        SyncOutbox.modele == modele, SyncOutbox.objet_id.in_(ids),
+        SyncOutbox.action == 'sync', SyncOutbox.statut == 'pending'
+    )))
+    return [objet_id for objet_id in ids if objet_id not in en_attente]
+
+def _publiables(modele, ids):
+    if not ids:
+        return set()
+    Modele = MODELES[modele]
+    return set(db.session.scalars(select(Modele.id).where(Modele.id.in_(ids), filtre_publication(modele))))
+
+def action_groupee(modele, action, ids):
+    """Applique une action à plusieurs éléments en une transaction ; retourne le résultat par id"""
+    Modele = MODELES[modele]
+    colonne = COLONNES_PUBLICATION.get(modele)
+    if action not in ACTIONS_GROUPEES or (action in ('publier', 'depublier') and colonne is None):
+        raise ValueError(f"Action '{action}' non disponible pour les {PLURIELS[modele]}")
+    
+    publie = getattr(Modele, colonne) if colonne else true()
+    lignes = db.session.execute(
+        select(Modele.id, Modele.sync_id, publie).where(Modele.id.in_(ids)).with_for_update()
+    ).all()
+    resultats = {objet_id: 'introuvable' for objet_id in ids}
+    maintenant = datetime.utcnow()
+    
+    if action == 'publier':
+        a_publier = [objet_id for objet_id, _, est_publie in lignes if not est_publie]
+        resultats.update({objet_id: 'déjà publié' for objet_id, _, est_publie in lignes if est_publie})
+        if a_publier:
+            db.session.execute(
+                update(Modele).where(Modele.id.in_(a_publier))
+                .values({colonne: True, 'date_modification': maintenant})
+                .execution_options(synchronize_session=False)
+            )
+            journaliser(modele, a_publier)
+            publiables = _publiables(modele, a_publier)
+            planifier_syncs(modele, _sans_sync_en_attente(modele, sorted(publiables)))
+            resultats.update({objet_id: 'publié' if objet_id in publiables else 'publication programmée'
+                              for objet_id in a_publier})
+    
+    elif action == 'depublier':
+        a_retirer = [(objet_id, sync_id) for objet_id, sync_id, est_publie in lignes if est_publie]
+        resultats.update({objet_id: 'déjà dépublié' for objet_id, _, est_publie in lignes if not est_publie})
+        if a_retirer:
+            ids_retires = [objet_id for objet_id, _ in a_retirer]
+            db.session.execute(
+                update(Modele).where(Modele.id.in_(ids_retires))
+                .values({colonne: False, 'sync_id': None, 'sync_hash': None, 'date_modification': maintenant})
+                .execution_options(synchronize_session=False)
+            )
+            journaliser(modele, ids_retires)
+            planifier_suppressions(modele, [(objet_id, sync_id) for objet_id, sync_id in a_retirer if sync_id])
+            resultats.update({objet_id: 'dépublié' for objet_id in ids_retires})
+    
+    elif action == 'supprimer':
+        ids_trouves = [objet_id for objet_id, _, _ in lignes]
+        if ids_trouves:
+            planifier_suppressions(modele, [(objet_id, sync_id) for objet_id, sync_id, _ in lignes if sync_id])
+            db.session.execute(
+                delete(Modele).where(Modele.id.in_(ids_trouves)).execution_options(synchronize_session=False)
+            )
+            journaliser(modele, ids_trouves, 'delete')
+            supprimer_index_recherche(db.session.connection(), modele, ids_trouves)
+            resultats.update({objet_id: 'supprimé' for objet_id in ids_trouves})
+    
+    else:
+        publiables = _publiables(modele, [objet_id for objet_id, _, _ in lignes])
+        planifier_syncs(modele, _sans_sync_en_attente(modele, sorted(publiables)))
+        resultats.update({objet_id: 'synchronisation planifiée' if objet_id in publiables else 'non publié, ignoré'
+                          for objet_id, _, _ in lignes})
+    
+    db.session.commit()
+    reveiller_worker_sync()
+    return resultats
+
+@app.route('/actions-groupees/<pluriel>', methods=['POST'])
+@login_required
+def actions_groupees(pluriel):
+    """Publie, dépublie, supprime ou synchronise les éléments cochés d'une liste"""
+    modele = MODELES_PAR_PLURIEL.get(pluriel)
+    if modele is None:
+        abort(404)
+    json_demande = request.accept_mimetypes.best == 'application/json'
+    try:
+        ids = sorted({int(objet_id) for objet_id in request.form.getlist('ids')})
+    except ValueError:
+        ids = []
+    
+    if not ids:
+        if json_demande:
+            return jsonify({'success': False, 'message': 'Aucun élément sélectionné'}), 400
+        flash('Aucun élément sélectionné', 'warning')
+        return redirect(url_for(pluriel))
+    
+    try:
+        resultats = action_groupee(modele, request.form.get('action'), ids)
+    except ValueError as e:
+        if json_demande:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'warning')
+        return redirect(url_for(pluriel))
+    except Exception as e:
+        db.session.rollback()
+        if json_demande:
+            return jsonify({'success': False, 'message': str(e)}), 500
+        flash(f'Erreur lors de l\'action groupée: {str(e)}', 'danger')
+        return redirect(url_for(pluriel))
+    
+    if json_demande:
+        return jsonify({'success': True, 'resultats': resultats})
+    
+    compteurs = {}
+    for resultat in resultats.values():
+        compteurs[resultat] = compteurs.get(resultat, 0) + 1
+    details = ', '.join(f"{nombre} {resultat}" for resultat, nombre in compteurs.items())
+    flash(f"{LIBELLES[modele]} : {details}", 'warning' if 'introuvable' in compteurs else 'success')
+    return redirect(url_for(pluriel))
+
+# --- ROUTE DE RECHERCHE ---
+@app.route('/recherche')
+@login_required
+def recherche():
+    terme = request.args.get('q', '').strip()
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
+    resultats, a_suivant = rechercher(terme, page) if terme else ([], False)
+    return render_template('recherche.html', terme=terme, resultats=resultats, page=page, a_suivant=a_suivant)
+
+@app.cli.command('reindexer-recherche')
+def reindexer_recherche_commande():
+    """Reconstruit l'index de recherche plein texte"""
+    reindexer_recherche()
+    print("Index de recherche reconstruit")
+
 # --- ROUTES DE SYNCHRONISATION MANUELLE ---
 
 @app.route('/sync/all')
@@ -816,32 +2907,451 @@ def supprimer_offre(id):
 def sync_all():
     """Synchronise tous les éléments avec le site principal"""
     try:
-        # Synchroniser les activités publiées
-        activites = Activite.query.filter_by(est_publie=True).all()
-        for activite in activites:
-            sync_activite(activite)
-        
-        # Synchroniser les réalisations
-        realisations = Realisation.query.all()
-        for realisation in realisations:
-            sync_realisation(realisation)
-        
-        # Synchroniser les annonces actives
-        annonces = Annonce.query.filter_by(est_active=True).all()
-        for annonce in annonces:
-            sync_annonce(annonce)
-        
-        # Synchroniser les offres actives
-        offres = Offre.query.filter_by(est_active=True).all()
-        for offre in offres:
-            sync_offre(offre)
-        
-        flash('Tous les éléments ont été synchronisés avec le site principal!', 'success')
+        # Les identifiants sont lus par tranches ; chaque thread charge sa tranche
+        # et valide ses écritures en un seul commit
+        capacites = capacites_lot()
+        taille = capacites['max_items'] if capacites else SYNC_CHUNK_SIZE
+        tranches = (
+            (modele, ids)
+            for modele in MODELES
+            for ids in iterer_ids_par_tranches(modele, taille, filtre_publication(modele))
+        )
+        resume = synchroniser_en_parallele(tranches)
+        db.session.commit()
     except Exception as e:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': str(e)}), 500
         flash(f'Erreur lors de la synchronisation: {str(e)}', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': True, 'resume': resume})
+
+    if not any(resultat['succes'] or resultat['echecs'] for resultat in resume.values()):
+        flash('Aucun élément à synchroniser', 'info')
+    for modele, resultat in resume.items():
+        if not resultat['succes'] and not resultat['echecs']:
+            continue
+        message = f"{LIBELLES[modele]} : {resultat['succes']} synchronisé(s), {resultat['echecs']} échec(s)"
+        if resultat['erreurs']:
+            premiere = resultat['erreurs'][0]
+            message += f" (ex. #{premiere['id']}: {premiere['message']})"
+        flash(message, 'warning' if resultat['echecs'] else 'success')
+    
+    return redirect(url_for('dashboard'))
+
+# --- RÉCONCILIATION AVEC LE SITE PRINCIPAL ---
+
+class InventaireIndisponible(Exception):
+    """Le site principal ne fournit pas (ou pas correctement) son inventaire"""
+
+def inventaire_distant(modele):
+    """Inventaire du site principal pour un modèle : {sync_id: empreinte}, lu page par page.
+    
+    GET /api/<endpoint>/inventory?after=<curseur>&limit=<n> répond
+    {"items": [{"id": ..., "digest": ...}], "next": <curseur ou null>} ; l'empreinte est
+    le SHA-256 du payload reçu, calculé comme empreinte_payload.
+    """
+    inventaire = {}
+    curseur = None
+    while True:
+        params = {'limit': RECONCILIATION_PAGE_SIZE}
+        if curseur is not None:
+            params['after'] = curseur
+        response = appel_site('GET', f"{SITE_URL}/api/{PLURIELS[modele]}/inventory",
+                              headers={'X-API-Key': API_KEY}, params=params, timeout=30)
+        if response.status_code != 200:
+            raise InventaireIndisponible(f"Erreur HTTP {response.status_code} lors de la lecture de l'inventaire")
+        try:
+            page = response.json()
+            inventaire.update((str(item['id']), item.get('digest')) for item in page['items'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise InventaireIndisponible(f"Inventaire invalide: {str(e)}")
+        curseur = page.get('next')
+        if not curseur or not page['items']:
+            return inventaire
+
+def comparer_inventaires(modele, distant):
+    """Compare l'état local à l'inventaire distant ; retourne (manquants, obsoletes, orphelins).
+    
+    manquants : ids locaux publiés absents du site ; obsoletes : ids locaux dont la copie distante
+    diffère de la dernière version envoyée ; orphelins : sync_id distants sans élément local publié.
+    """
+    Modele = MODELES[modele]
+    lignes = db.session.execute(
+        select(Modele.id, Modele.sync_id, Modele.sync_hash).where(filtre_publication(modele))
+    ).all()
+    locaux = {sync_id: (objet_id, empreinte) for objet_id, sync_id, empreinte in lignes if sync_id}
+    
+    communs = locaux.keys() & distant.keys()
+    manquants = [objet_id for objet_id, sync_id, _ in lignes if not sync_id]
+    manquants += [locaux[sync_id][0] for sync_id in locaux.keys() - distant.keys()]
+    obsoletes = [locaux[sync_id][0] for sync_id in communs if locaux[sync_id][1] != distant[sync_id]]
+    orphelins = sorted(distant.keys() - locaux.keys())
+    return sorted(manquants), sorted(obsoletes), orphelins
+
+def reconcilier(reparer=True, differe=False):
+    """Compare chaque modèle au site principal et, si demandé, ne répare que les écarts.
+    
+    differe=True confie la réparation à la file d'attente (traitée par le worker) au lieu de l'exécuter ici.
+    """
+    rapport = {}
+    tranches = []
+    for modele, Modele in MODELES.items():
+        manquants, obsoletes, orphelins = comparer_inventaires(modele, inventaire_distant(modele))
+        rapport[modele] = {'manquants': manquants, 'obsoletes': obsoletes, 'orphelins': orphelins}
+        if not reparer:
+            continue
+        
+        # Copie distante absente : recréer l'élément ; copie différente : forcer un nouvel envoi
+        # date_modification réécrite à l'identique : ces colonnes techniques ne changent pas le contenu
+        if manquants:
+            db.session.execute(update(Modele).where(Modele.id.in_(manquants)).values(
+                sync_id=None, sync_hash=None, date_modification=Modele.date_modification))
+        if obsoletes:
+            db.session.execute(update(Modele).where(Modele.id.in_(obsoletes)).values(
+                sync_hash=None, date_modification=Modele.date_modification))
+        a_envoyer = manquants + obsoletes
+        if differe:
+            planifier_syncs(modele, a_envoyer)
+            # Orphelins : aucun élément local, objet_id 0 ; la suppression est réessayée jusqu'à confirmation
+            planifier_suppressions(modele, [(0, sync_id) for sync_id in orphelins])
+            rapport[modele]['reparation'] = {'planifies': len(a_envoyer) + len(orphelins)}
+        db.session.commit()
+        if differe:
+            continue
+        tranches += [(modele, a_envoyer[debut:debut + SYNC_CHUNK_SIZE])
+                     for debut in range(0, len(a_envoyer), SYNC_CHUNK_SIZE)]
+    
+    if not reparer:
+        return rapport
+    if differe:
+        reveiller_worker_sync()
+        return rapport
+    
+    # Une seule passe : envois parallèles des éléments à réparer, puis suppression des orphelins
+    resume = synchroniser_en_parallele(tranches)
+    with ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY) as executor:
+        futures = {executor.submit(delete_from_site, modele, sync_id): modele
+                   for modele in MODELES for sync_id in rapport[modele]['orphelins']}
+        for future in as_completed(futures):
+            success, message = future.result()
+            resultat = resume[futures[future]]
+            resultat['succes' if success else 'echecs'] += 1
+            if not success and len(resultat['erreurs']) < 100:
+                resultat['erreurs'].append({'id': None, 'message': message})
+    for modele in MODELES:
+        rapport[modele]['reparation'] = resume[modele]
+    return rapport
+
+@app.route('/sync/reconcilier', methods=['GET', 'POST'])
+@login_required
+def reconcilier_route():
+    """Compare l'admin au site principal (GET : rapport seul) ; POST planifie la réparation des écarts"""
+    reparer = request.method == 'POST'
+    try:
+        rapport = reconcilier(reparer=reparer, differe=True)
+    except Exception as e:
+        db.session.rollback()
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': False, 'message': str(e)}), 502
+        flash(f'Erreur lors de la réconciliation: {str(e)}', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': True, 'rapport': rapport})
+    
+    for modele, ecarts in rapport.items():
+        message = (f"{LIBELLES[modele]} : {len(ecarts['manquants'])} manquant(s), "
+                   f"{len(ecarts['obsoletes'])} obsolète(s), {len(ecarts['orphelins'])} orphelin(s)")
+        if 'reparation' in ecarts:
+            message += f" — {ecarts['reparation']['planifies']} réparation(s) planifiée(s)"
+        ecart = ecarts['manquants'] or ecarts['obsoletes'] or ecarts['orphelins']
+        flash(message, 'warning' if ecart else 'success')
+    return redirect(url_for('dashboard'))
+
+@app.cli.command('reconcilier')
+@click.option('--sans-reparation', is_flag=True, help="Affiche les écarts sans rien modifier")
+def reconcilier_commande(sans_reparation):
+    """Compare les inventaires local et distant et ne resynchronise que les écarts (en une passe, ici)"""
+    rapport = reconcilier(reparer=not sans_reparation)
+    for modele, ecarts in rapport.items():
+        print(f"{LIBELLES[modele]} : {len(ecarts['manquants'])} manquant(s), "
+              f"{len(ecarts['obsoletes'])} obsolète(s), {len(ecarts['orphelins'])} orphelin(s)")
+        if 'reparation' in ecarts:
+            print(f"  réparés : {ecarts['reparation']['succes']}, échecs : {ecarts['reparation']['echecs']}")
+
+# --- IMPORT / EXPORT EN MASSE ---
+
+MODELES_PAR_PLURIEL = {pluriel: modele for modele, pluriel in PLURIELS.items()}
+
+def colonnes_export(Modele):
+    """Colonnes exportées (les colonnes de suivi de synchronisation restent locales)"""
+    return [colonne for colonne in Modele.__table__.columns if colonne.name not in COLONNES_TECHNIQUES]
+
+def iterer_export(modele):
+    """Parcourt une table par lots (curseur côté serveur), sans objets ORM"""
+    Modele = MODELES[modele]
+    colonnes = colonnes_export(Modele)
+    resultat = db.session.execute(
+        select(*colonnes).order_by(Modele.id).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    for ligne in resultat:
+        yield {
+            colonne.name: valeur.isoformat() if isinstance(valeur, (datetime, date)) else valeur
+            for colonne, valeur in zip(colonnes, ligne)
+        }
+
+def generer_export(format_export):
+    """Produit l'export morceau par morceau, en NDJSON ou au format de data/data.json"""
+    if format_export == 'ndjson':
+        for modele in MODELES:
+            for item in iterer_export(modele):
+                yield json.dumps({'modele': modele, 'data': item}, ensure_ascii=False) + '\n'
+        return
+    
+    yield '{\n'
+    for modele in MODELES:
+        yield f'  "{PLURIELS[modele]}": ['
+        premier = True
+        for item in iterer_export(modele):
+            yield ('\n    ' if premier else ',\n    ') + json.dumps(item, ensure_ascii=False)
+            premier = False
+        yield '],\n' if premier else '\n  ],\n'
+    yield f'  "last_update": "{datetime.utcnow().isoformat()}"\n}}\n'
+
+class _LecteurJSON:
+    """Lecture incrémentale d'un document JSON depuis un flux, avec un tampon borné"""
+    
+    def __init__(self, flux, taille_bloc=65536):
+        self.flux = flux
+        self.taille_bloc = taille_bloc
+        self.tampon = ''
+        self.pos = 0
+        self.fin = False
+        self.decodeur = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+    
+    def _remplir(self):
+        bloc = self.flux.read(self.taille_bloc)
+        if isinstance(bloc, bytes):
+            bloc = self.utf8.decode(bloc, final=not bloc)
+        if not bloc:
+            self.fin = True
+            return False
+        self.tampon = self.tampon[self.pos:] + bloc
+        self.pos = 0
+        return True
+    
+    def suivant(self):
+        """Retourne le prochain caractère significatif sans le consommer ('' en fin de flux)"""
+        while True:
+            while self.pos < len(self.tampon) and self.tampon[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.tampon):
+                return self.tampon[self.pos]
+            if not self._remplir():
+                return ''
+    
+    def consommer(self, attendu):
+        if self.suivant() != attendu:
+            raise ValueError(f"JSON invalide : '{attendu}' attendu")
+        self.pos += 1
+    
+    def valeur(self):
+        """Décode la prochaine valeur JSON complète"""
+        self.suivant()
+        while True:
+            try:
+                valeur, fin = self.decodeur.raw_decode(self.tampon, self.pos)
+            except json.JSONDecodeError:
+                if not self._remplir():
+                    raise ValueError("JSON invalide ou tronqué")
+                continue
+            # Un nombre en fin de tampon peut être incomplet
+            if fin == len(self.tampon) and not isinstance(valeur, (dict, list, str)) and self._remplir():
+                continue
+            self.pos = fin
+            return valeur
+
+def iterer_data_json(flux):
+    """Parcourt un fichier au format data.json élément par élément, sans le charger en mémoire"""
+    lecteur = _LecteurJSON(flux)
+    lecteur.consommer('{')
+    if lecteur.suivant() == '}':
+        return
+    while True:
+        cle = lecteur.valeur()
+        lecteur.consommer(':')
+        modele = MODELES_PAR_PLURIEL.get(cle)
+        if modele and lecteur.suivant() == '[':
+            lecteur.consommer('[')
+            if lecteur.suivant() == ']':
+                lecteur.consommer(']')
+            else:
+                while True:
+                    yield modele, lecteur.valeur()
+                    if lecteur.suivant() != ',':
+                        break
+                    lecteur.consommer(',')
+                lecteur.consommer(']')
+        else:
+            lecteur.valeur()  # clé ignorée (last_update, ...)
+        if lecteur.suivant() != ',':
+            break
+        lecteur.consommer(',')
+    lecteur.consommer('}')
+
+def iterer_ndjson(flux):
+    """Parcourt un flux NDJSON ({"modele": ..., "data": {...}} par ligne)"""
+    for numero, ligne in enumerate(flux, 1):
+        if isinstance(ligne, bytes):
+            ligne = ligne.decode('utf-8')
+        ligne = ligne.strip()
+        if not ligne:
+            continue
+        try:
+            objet = json.loads(ligne)
+        except json.JSONDecodeError:
+            raise ValueError(f"Ligne {numero} : JSON invalide")
+        yield objet.get('modele'), objet.get('data') or {}
+
+def preparer_ligne(Modele, data):
+    """Convertit un élément importé en ligne à insérer (toutes les colonnes, pour des lots homogènes)"""
+    ligne = {}
+    for colonne in colonnes_export(Modele):
+        if colonne.name in ('id', 'date_modification'):
+            continue
+        if colonne.name not in data:
+            if colonne.default is not None and colonne.default.is_scalar:
+                ligne[colonne.name] = colonne.default.arg
+            else:
+                ligne[colonne.name] = datetime.utcnow() if colonne.name == 'date_creation' else None
+            continue
+        valeur = data[colonne.name]
+        if isinstance(colonne.type, db.DateTime):
+            valeur = datetime.fromisoformat(valeur) if valeur else None
+        elif isinstance(colonne.type, db.Date):
+            valeur = date.fromisoformat(valeur[:10]) if valeur else None
+        elif isinstance(colonne.type, db.Boolean) and isinstance(valeur, str):
+            valeur = valeur.lower() in ('true', '1', 'oui')
+        ligne[colonne.name] = valeur
+    if not ligne.get('titre'):
+        raise ValueError("titre manquant")
+    return ligne
+
+def _inserer_lot(modele, lignes):
+    """Insère un lot en une requête multi-lignes et le valide dans sa propre transaction"""
+    Modele = MODELES[modele]
+    ids = db.session.scalars(insert(Modele).returning(Modele.id, sort_by_parameter_order=True), lignes).all()
+    journaliser(modele, ids)
+    indexer_recherche(db.session.connection(), modele, ids)
+    # Seuls les éléments publiables sont envoyés (une annonce programmée l'est par le planificateur)
+    publiables = db.session.scalars(select(Modele.id).where(Modele.id.in_(ids), filtre_publication(modele))).all()
+    planifier_syncs(modele, publiables)
+    db.session.commit()
+    return len(ids)
+
+def importer_elements(elements, taille_lot=IMPORT_BATCH_SIZE):
+    """Importe des couples (modèle, données) par lots et retourne (nombre par modèle, erreurs)"""
+    lots = {modele: [] for modele in MODELES}
+    resume = {modele: 0 for modele in MODELES}
+    erreurs = []
+    for numero, (modele, data) in enumerate(elements, 1):
+        if modele not in MODELES:
+            erreurs.append(f"Élément {numero} : modèle inconnu '{modele}'")
+            continue
+        try:
+            lots[modele].append(preparer_ligne(MODELES[modele], data))
+        except (ValueError, TypeError, AttributeError) as e:
+            erreurs.append(f"Élément {numero} : {str(e)}")
+            continue
+        if len(lots[modele]) >= taille_lot:
+            resume[modele] += _inserer_lot(modele, lots[modele])
+            lots[modele] = []
+    for modele, lignes in lots.items():
+        if lignes:
+            resume[modele] += _inserer_lot(modele, lignes)
+    return resume, erreurs
+
+@app.route('/export')
+@login_required
+def exporter():
+    """Export en continu de tout le contenu (NDJSON par défaut, ou format data.json)"""
+    format_export = request.args.get('format', 'ndjson')
+    if format_export not in ('ndjson', 'json'):
+        flash('Format d\'export inconnu', 'warning')
+        return redirect(url_for('dashboard'))
+    nom_fichier = f"labmath-export.{format_export}"
+    return app.response_class(
+        stream_with_context(generer_export(format_export)),
+        mimetype='application/x-ndjson' if format_export == 'ndjson' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename={nom_fichier}'}
+    )
+
+@app.route('/import', methods=['POST'])
+@login_required
+def importer():
+    """Import d'un fichier NDJSON ou data.json, par lots et en mémoire constante"""
+    request.max_content_length = IMPORT_MAX_CONTENT_LENGTH
+    fichier = request.files.get('fichier')
+    if not fichier:
+        flash('Aucun fichier fourni', 'warning')
+        return redirect(url_for('dashboard'))
+    
+    format_import = request.form.get('format') or ('json' if fichier.filename.endswith('.json') else 'ndjson')
+    try:
+        if format_import == 'json':
+            elements = iterer_data_json(fichier.stream)
+        else:
+            elements = iterer_ndjson(fichier.stream)
+        resume, erreurs = importer_elements(elements)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        flash(f'Import interrompu: {str(e)} (les lots précédents ont été enregistrés)', 'danger')
+        return redirect(url_for('dashboard'))
+    reveiller_worker_sync()
     
+    details = ', '.join(f"{LIBELLES[modele]}: {nombre}" for modele, nombre in resume.items() if nombre)
+    flash(f"Import terminé ({details or 'aucun élément'})", 'success')
+    if erreurs:
+        flash(f"{len(erreurs)} élément(s) ignoré(s), ex. {erreurs[0]}", 'warning')
     return redirect(url_for('dashboard'))
 
+FICHIER_DONNEES = os.path.join(app.root_path, 'data', 'data.json')
+
+@app.cli.command('exporter-donnees')
+@click.argument('fichier', default=FICHIER_DONNEES)
+@click.option('--format', 'format_export', type=click.Choice(['json', 'ndjson']), default=None,
+              help="Format de sortie (déduit de l'extension par défaut)")
+def exporter_donnees_commande(fichier, format_export):
+    """Exporte tout le contenu (par défaut dans data/data.json, '-' pour la sortie standard)"""
+    format_export = format_export or ('json' if fichier.endswith('.json') else 'ndjson')
+    sortie = click.get_text_stream('stdout') if fichier == '-' else open(fichier, 'w', encoding='utf-8')
+    try:
+        for morceau in generer_export(format_export):
+            sortie.write(morceau)
+    finally:
+        if fichier != '-':
+            sortie.close()
+
+@app.cli.command('importer-donnees')
+@click.argument('fichier', default=FICHIER_DONNEES)
+@click.option('--format', 'format_import', type=click.Choice(['json', 'ndjson']), default=None,
+              help="Format d'entrée (déduit de l'extension par défaut)")
+def importer_donnees_commande(fichier, format_import):
+    """Importe un fichier NDJSON ou data.json (par défaut data/data.json)"""
+    format_import = format_import or ('json' if fichier.endswith('.json') else 'ndjson')
+    with open(fichier, 'rb') as flux:
+        elements = iterer_data_json(flux) if format_import == 'json' else iterer_ndjson(flux)
+        resume, erreurs = importer_elements(elements)
+    for modele, nombre in resume.items():
+        print(f"{LIBELLES[modele]} : {nombre} importé(s)")
+    for erreur in erreurs[:20]:
+        print(f"  ignoré - {erreur}")
+    if len(erreurs) > 20:
+        print(f"  ... et {len(erreurs) - 20} autre(s)")
+
 # --- ROUTES API POUR LE SITE PRINCIPAL ---
 
 @app.route('/api/health')
@@ -853,6 +3363,120 @@ def api_health():
         'timestamp': datetime.utcnow().isoformat()
     })
 
+def generer_liste_api(modele, filtre, total):
+    """Sérialise la liste en continu, les lignes étant lues par lots (curseur côté serveur)"""
+    Modele = MODELES[modele]
+    yield f'{{"success": true, "total": {total}, "items": ['
+    elements = db.session.scalars(
+        select(Modele).options(undefer_group('texte')).where(filtre)
+        .order_by(Modele.date_creation.desc(), Modele.id.desc())
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    for position, element in enumerate(elements):
+        yield (',' if position else '') + json.dumps(PAYLOADS[modele](element), ensure_ascii=False)
+    yield ']}'
+
+def reponse_api_liste(modele):
+    """Liste des éléments publiés avec ETag fort et Last-Modified (réponse 304 si inchangée)"""
+    Modele = MODELES[modele]
+    filtre = filtre_publication(modele)
+    
+    # Empreinte calculée par une seule agrégation, sans charger ni sérialiser les lignes
+    total, derniere_modification, somme_ids = db.session.query(
+        func.count(Modele.id),
+        func.max(func.coalesce(Modele.date_modification, Modele.date_creation)),
+        func.coalesce(func.sum(Modele.id), 0)
+    ).filter(filtre).one()
+    etag = hashlib.sha256(f"{modele}|{total}|{derniere_modification}|{somme_ids}".encode()).hexdigest()[:32]
+    
+    if request.if_none_match:
+        inchange = request.if_none_match.contains(etag)
+    else:
+        inchange = bool(
+            request.if_modified_since and derniere_modification
+            and derniere_modification.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+        )
+    if inchange:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(
+            stream_with_context(generer_liste_api(modele, filtre, total)), mimetype='application/json'
+        )
+    
+    response.set_etag(etag)
+    if derniere_modification:
+        response.last_modified = derniere_modification
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/changes')
+@api_key_required
+def api_changes():
+    """Flux des modifications postérieures à un curseur (réplication incrémentale)"""
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), CHANGES_LIMIT_MAX)
+    
+    entrees = JournalModification.query.filter(
+        JournalModification.version > since
+    ).order_by(JournalModification.version).limit(limit + 1).all()
+    has_more = len(entrees) > limit
+    entrees = entrees[:limit]
+    
+    # Seule la dernière version de chaque élément de la page est utile
+    dernieres = {}
+    for entree in entrees:
+        dernieres[(entree.modele, entree.objet_id)] = entree
+    
+    # Chargement des éléments modifiés : une requête par modèle
+    objets = {}
+    for modele, Modele in MODELES.items():
+        ids = [objet_id for (m, objet_id), entree in dernieres.items() if m == modele and entree.action == 'upsert']
+        if ids:
+            for objet in Modele.query.options(undefer_group('texte')).filter(Modele.id.in_(ids)):
+                objets[(modele, objet.id)] = objet
+    
+    changes = []
+    for (modele, objet_id), entree in sorted(dernieres.items(), key=lambda item: item[1].version):
+        objet = objets.get((modele, objet_id))
+        change = {'version': entree.version, 'modele': modele, 'id': objet_id}
+        if objet is not None and est_publiable(modele, objet):
+            change.update(action='upsert', data=PAYLOADS[modele](objet))
+        else:
+            # Supprimé, ou retiré du site (dépublié / désactivé)
+            change['action'] = 'delete'
+        changes.append(change)
+    
+    return jsonify({
+        'success': True,
+        'changes': changes,
+        'cursor': entrees[-1].version if entrees else since,
+        'has_more': has_more
+    })
+
+@app.route('/api/activites')
+@api_key_required
+def api_activites():
+    """Activités publiées"""
+    return reponse_api_liste('activite')
+
+@app.route('/api/realisations')
+@api_key_required
+def api_realisations():
+    """Réalisations"""
+    return reponse_api_liste('realisation')
+
+@app.route('/api/annonces')
+@api_key_required
+def api_annonces():
+    """Annonces actives"""
+    return reponse_api_liste('annonce')
+
+@app.route('/api/offres')
+@api_key_required
+def api_offres():
+    """Offres actives"""
+    return reponse_api_liste('offre')
+
 # --- GESTION DES ERREURS ---
 
 @app.errorhandler(404)
@@ -867,17 +3491,85 @@ def internal_server_error(e):
         return render_template('500.html', error=str(e)), 500
     return redirect(url_for('login'))
 
+# --- MIGRATION DU SCHÉMA ---
+
+def migrer_schema():
+    """Met à niveau une base existante (db.create_all ne modifie pas les tables déjà créées)"""
+    inspecteur = inspect(db.engine)
+    
+    # Colonnes ajoutées après la création initiale des tables (nullables, sans valeur par défaut côté serveur)
+    for table in db.metadata.sorted_tables:
+        if not inspecteur.has_table(table.name):
+            continue
+        existantes = {colonne['name'] for colonne in inspecteur.get_columns(table.name)}
+        for colonne in table.columns:
+            if colonne.name not in existantes:
+                type_sql = colonne.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connexion:
+                    connexion.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {colonne.name} {type_sql}'))
+    
+    # Index ajoutés après la création initiale des tables
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    # Journal vide sur une base existante : une version initiale pour chaque élément
+    if db.session.query(JournalModification.version).first() is None:
+        verrouiller_journal(db.session.connection())
+        for modele, Modele in MODELES.items():
+            db.session.execute(insert(JournalModification).from_select(
+                ['modele', 'objet_id', 'action', 'date_creation'],
+                select(literal(modele), Modele.id, literal('upsert'), func.coalesce(Modele.date_creation, func.now()))
+                .order_by(Modele.id)
+            ))
+        db.session.commit()
+    
+    # Index de recherche créé sur une base existante : indexer le contenu déjà présent
+    try:
+        if preparer_index_recherche():
+            reindexer_recherche()
+    except Exception as e:
+        print(f"Recherche plein texte indisponible: {str(e)}")
+
+# Clé du verrou consultatif Postgres : une seule migration à la fois, même entre plusieurs instances
+VERROU_MIGRATION = 7410002
+
+def initialiser_base():
+    """Crée les tables manquantes puis migre le schéma, sous verrou sur Postgres"""
+    with db.engine.connect() as verrou:
+        postgres = verrou.dialect.name == 'postgresql'
+        if postgres:
+            verrou.execute(text("SELECT pg_advisory_lock(:cle)"), {'cle': VERROU_MIGRATION})
+        try:
+            db.create_all()
+            migrer_schema()
+        finally:
+            if postgres:
+                verrou.execute(text("SELECT pg_advisory_unlock(:cle)"), {'cle': VERROU_MIGRATION})
+
+@app.cli.command('migrer-schema')
+def migrer_schema_commande():
+    """Crée les tables et ajoute les colonnes et index manquants à la base existante"""
+    initialiser_base()
+    print("Schéma mis à jour")
+
 # --- INITIALISATION ---
+# Sous gunicorn, la migration est faite une seule fois par le processus maître avant le
+# démarrage des workers (voir gunicorn.conf.py), qui désactive MIGRATE_ON_STARTUP.
+# Avec `python app.py`, les processus 'spawn' du pool d'images réimportent ce module
+# (sous le nom __mp_main__) : eux non plus ne touchent pas à la base.
+MIGRATE_ON_STARTUP = (os.environ.get('MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+                      and __name__ != '__mp_main__')
+
 with app.app_context():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    db.create_all()
     
-    # Créer les tables si elles n'existent pas
-    try:
-        db.create_all()
-        print("Base de données initialisée avec succès")
-    except Exception as e:
-        print(f"Erreur lors de l'initialisation de la base de données: {str(e)}")
+    if MIGRATE_ON_STARTUP:
+        try:
+            initialiser_base()
+            print("Base de données initialisée avec succès")
+        except Exception as e:
+            print(f"Erreur lors de l'initialisation de la base de données: {str(e)}")
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
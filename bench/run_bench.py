@@ -0,0 +1,218 @@
+"""Benchmarks de l'admin Labmath sur SQLite, contre un faux site principal local.
+
+Mesure la latence (p50/p99) et le débit (requêtes/s) des pages de liste, du
+tableau de bord, des routes de création/modification (avec la synchronisation
+traitée par la file d'attente) et de /sync/all, pour plusieurs volumes de données.
+
+Usage :
+    python bench/run_bench.py
+    python bench/run_bench.py --tailles 10,1000 --latence 0.01 --taux-erreur 0.05
+    python bench/run_bench.py --sans-lots   # repli sur un appel par élément
+    python bench/run_bench.py --sortie bench_output.txt --json resultats.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from stub_site import StubSite
+
+
+def percentile(valeurs, p):
+    """Percentile par rang le plus proche (valeurs déjà triées)"""
+    if not valeurs:
+        return 0.0
+    rang = max(0, min(len(valeurs) - 1, math.ceil(p / 100 * len(valeurs)) - 1))
+    return valeurs[rang]
+
+
+def resultat(scenario, taille, durees, erreurs=0):
+    durees = sorted(durees)
+    total = sum(durees)
+    return {
+        'scenario': scenario,
+        'lignes': taille,
+        'requetes': len(durees),
+        'erreurs': erreurs,
+        'p50_ms': round(percentile(durees, 50) * 1000, 2),
+        'p99_ms': round(percentile(durees, 99) * 1000, 2),
+        'req_s': round(len(durees) / total, 1) if total else 0.0
+    }
+
+
+def mesurer(scenario, taille, requetes, appel):
+    """Exécute `appel` plusieurs fois ; une exception ou une réponse 4xx/5xx compte comme une erreur"""
+    durees, erreurs = [], 0
+    for i in range(requetes):
+        debut = time.perf_counter()
+        try:
+            echec = appel(i).status_code >= 400
+        except Exception:
+            echec = True
+        durees.append(time.perf_counter() - debut)
+        erreurs += echec
+    return resultat(scenario, taille, durees, erreurs)
+
+
+def peupler(application, taille):
+    """Vide les tables puis insère `taille` lignes par modèle (insertions en masse)"""
+    db = application.db
+    from sqlalchemy import insert
+
+    with application.app.app_context():
+        for Modele in list(application.MODELES.values()) + [application.SyncOutbox, application.JournalModification]:
+            db.session.query(Modele).delete()
+        maintenant = datetime.utcnow()
+        dates = [maintenant - timedelta(minutes=i) for i in range(taille)]
+        texte = "Lorem ipsum dolor sit amet. " * 40
+        db.session.execute(insert(application.Activite), [
+            {'titre': f"Activité {i}", 'description': texte, 'contenu': texte * 4, 'auteur': 'bench',
+             'date_creation': dates[i], 'est_publie': i % 4 != 0} for i in range(taille)
+        ])
+        db.session.execute(insert(application.Realisation), [
+            {'titre': f"Réalisation {i}", 'description': texte, 'categorie': f"cat{i % 5}",
+             'date_creation': dates[i]} for i in range(taille)
+        ])
+        db.session.execute(insert(application.Annonce), [
+            {'titre': f"Annonce {i}", 'contenu': texte, 'type_annonce': 'info',
+             'date_creation': dates[i], 'est_active': i % 3 != 0} for i in range(taille)
+        ])
+        db.session.execute(insert(application.Offre), [
+            {'titre': f"Offre {i}", 'description': texte, 'type_offre': 'stage', 'lieu': 'Yaoundé',
+             'date_creation': dates[i], 'est_active': i % 3 != 0} for i in range(taille)
+        ])
+        db.session.commit()
+
+
+def executer(args):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stub = StubSite(args.latence, args.taux_erreur, graine=42, lots=not args.sans_lots).start()
+    dossier = tempfile.mkdtemp(prefix='labmath-bench-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(dossier, 'bench.sqlite')}",
+        'SITE_URL': stub.url,
+        'API_KEY': 'bench',
+        'SYNC_WORKER_ENABLED': 'false',  # la file d'attente est vidée explicitement
+        'SYNC_BACKOFF_BASE': os.environ.get('SYNC_BACKOFF_BASE', '0.01'),
+        'SYNC_DEBOUNCE_SECONDS': '0',  # chaque écriture mesurée est synchronisée immédiatement
+        'PAGE_CACHE_ENABLED': 'false',  # activé seulement pour les scénarios « cache froid / chaud »
+        'PAGE_CACHE_PATH': os.path.join(dossier, 'pages.sqlite'),
+    })
+    os.chdir(dossier)  # UPLOAD_FOLDER est relatif au répertoire courant
+
+    import app as application
+    client = application.app.test_client()
+    client.post('/login', data={'username': os.environ.get('ADMIN_USERNAME', 'admin'),
+                                'password': os.environ.get('ADMIN_PASSWORD', 'admin123')})
+
+    resultats = []
+    for taille in args.tailles:
+        peupler(application, taille)
+        stub.reinitialiser()
+        n = args.requetes
+
+        for page in ('activites', 'realisations', 'annonces', 'offres'):
+            resultats.append(mesurer(f"GET /{page}", taille, n, lambda i, page=page: client.get(f"/{page}")))
+        resultats.append(mesurer("GET /dashboard", taille, n, lambda i: client.get('/dashboard')))
+
+        # Cache de pages : froid (vidé avant chaque requête, coût du remplissage inclus) puis chaud
+        application.PAGE_CACHE_ENABLED = True
+        for page in ('activites', 'dashboard'):
+            def froid(i, page=page):
+                application.cache_pages.vider()
+                return client.get(f"/{page}")
+            resultats.append(mesurer(f"GET /{page} (cache froid)", taille, n, froid))
+            client.get(f"/{page}")
+            resultats.append(mesurer(f"GET /{page} (cache chaud)", taille, n,
+                                     lambda i, page=page: client.get(f"/{page}")))
+        application.cache_pages.vider()
+        application.PAGE_CACHE_ENABLED = False
+
+        resultats.append(mesurer("POST /activite/nouveau", taille, n, lambda i: client.post(
+            '/activite/nouveau',
+            data={'titre': f"Bench {i}", 'description': 'd', 'contenu': 'c', 'est_publie': 'true'})))
+        with application.app.app_context():
+            ids = [i for (i,) in application.db.session.query(application.Offre.id).limit(n)]
+        resultats.append(mesurer("POST /offre/<id>/modifier", taille, len(ids), lambda i: client.post(
+            f"/offre/{ids[i]}/modifier",
+            data={'titre': f"Offre modifiée {i}", 'description': 'd', 'lieu': 'Douala', 'est_active': 'true'})))
+
+        # Synchronisation des écritures ci-dessus : une mesure par entrée de la file d'attente
+        with application.app.app_context():
+            durees = []
+            while True:
+                debut = time.perf_counter()
+                traitees = application.traiter_outbox(limite=1)
+                if not traitees:
+                    break
+                durees.append(time.perf_counter() - debut)
+            echecs = application.SyncOutbox.query.filter_by(statut='failed').count()
+        resultats.append(resultat("worker outbox (par entrée)", taille, durees, echecs))
+
+        if not args.sans_sync_all:
+            for libelle in ("GET /sync/all (initial)", "GET /sync/all (inchangé)"):
+                appels_avant, octets_avant = stub.appels, stub.octets_recus
+                mesure = mesurer(libelle, taille, 1, lambda i: client.get(
+                    '/sync/all', headers={'Accept': 'application/json'}))
+                mesure['appels_site'] = stub.appels - appels_avant
+                mesure['octets_site'] = stub.octets_recus - octets_avant
+                resultats.append(mesure)
+
+    stub.stop()
+    return resultats
+
+
+def formater(resultats):
+    colonnes = ('scenario', 'lignes', 'requetes', 'erreurs', 'p50_ms', 'p99_ms', 'req_s')
+    largeurs = {c: max(len(c), *(len(str(r.get(c, ''))) for r in resultats)) for c in colonnes}
+    lignes = ['  '.join(c.ljust(largeurs[c]) for c in colonnes)]
+    lignes.append('  '.join('-' * largeurs[c] for c in colonnes))
+    for r in resultats:
+        ligne = '  '.join(str(r.get(c, '')).ljust(largeurs[c]) for c in colonnes)
+        if 'appels_site' in r:
+            ligne += f"  ({r['appels_site']} appels au site, {r['octets_site'] // 1024} Ko envoyés)"
+        lignes.append(ligne)
+    return '\n'.join(lignes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de l'admin Labmath")
+    parser.add_argument('--tailles', default='10,1000,10000',
+                        help="nombres de lignes par modèle, séparés par des virgules")
+    parser.add_argument('--requetes', type=int, default=50, help="requêtes mesurées par scénario")
+    parser.add_argument('--latence', type=float, default=0.005, help="latence du faux site principal (secondes)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="proportion de réponses 502 du faux site")
+    parser.add_argument('--sans-sync-all', action='store_true', help="ne pas mesurer /sync/all")
+    parser.add_argument('--sans-lots', action='store_true',
+                        help="le faux site n'annonce pas la synchronisation par lots (appels unitaires)")
+    parser.add_argument('--sortie', help="écrit aussi le tableau dans ce fichier")
+    parser.add_argument('--json', help="écrit les résultats bruts dans ce fichier JSON")
+    args = parser.parse_args()
+    args.tailles = [int(t) for t in args.tailles.split(',') if t]
+    # executer() change de répertoire courant : chemins de sortie résolus avant
+    args.sortie = os.path.abspath(args.sortie) if args.sortie else None
+    args.json = os.path.abspath(args.json) if args.json else None
+    random.seed(42)
+
+    resultats = executer(args)
+    tableau = formater(resultats)
+    print(tableau)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            fichier.write(tableau + '\n')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
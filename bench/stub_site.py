@@ -0,0 +1,164 @@
+"""Faux site principal pour les benchmarks : reproduit l'API de synchronisation en local.
+
+La latence et le taux d'erreur (réponses 502) sont configurables pour simuler
+un site principal lent ou instable. Le protocole par lots (GET /api/capabilities,
+POST /api/<endpoint>/batch avec un corps gzip) peut être désactivé pour tester
+le repli sur les appels unitaires. GET /api/<endpoint>/inventory expose les ids et
+empreintes des éléments reçus, pour la réconciliation.
+"""
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+
+def empreinte(data):
+    """Empreinte d'un payload reçu, calculée comme empreinte_payload côté admin"""
+    brut = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(brut.encode()).hexdigest()
+
+
+class StubSite:
+    """Site principal simulé, servi dans un thread du processus courant"""
+
+    ENDPOINTS = ('activites', 'realisations', 'annonces', 'offres')
+
+    def __init__(self, latence=0.0, taux_erreur=0.0, port=0, graine=None, lots=True, taille_lot=100):
+        self.latence = latence
+        self.taux_erreur = taux_erreur
+        self.port = port
+        self.lots = lots
+        self.taille_lot = taille_lot
+        self.appels = 0
+        self.erreurs = 0
+        self.octets_recus = 0
+        self.elements = {endpoint: {} for endpoint in self.ENDPOINTS}
+        self._ids = itertools.count(1)
+        self._aleatoire = random.Random(graine)
+        self._lock = threading.Lock()
+        self._serveur = None
+        self.app = self._creer_app()
+
+    def _creer_app(self):
+        app = Flask('stub_site')
+
+        @app.before_request
+        def simuler_reseau():
+            if request.path in ('/api/health', '/api/capabilities'):
+                return None
+            with self._lock:
+                self.appels += 1
+                self.octets_recus += request.content_length or 0
+                erreur = self._aleatoire.random() < self.taux_erreur
+                if erreur:
+                    self.erreurs += 1
+            if self.latence:
+                time.sleep(self.latence)
+            if erreur:
+                return 'Bad Gateway', 502
+            return None
+
+        @app.route('/api/health')
+        def health():
+            return jsonify({'status': 'ok'})
+
+        @app.route('/api/capabilities')
+        def capacites():
+            if not self.lots:
+                return jsonify({'success': False, 'message': 'Non supporté'}), 404
+            return jsonify({'batch': {'max_items': self.taille_lot, 'encodings': ['gzip']}})
+
+        @app.route('/api/<endpoint>/inventory')
+        def inventaire(endpoint):
+            if endpoint not in self.elements:
+                return jsonify({'success': False, 'message': 'Endpoint inconnu'}), 404
+            limite = request.args.get('limit', 1000, type=int)
+            apres = request.args.get('after', 0, type=int)
+            with self._lock:
+                ids = sorted(int(distant_id) for distant_id in self.elements[endpoint] if int(distant_id) > apres)[:limite]
+                items = [{'id': str(distant_id), 'digest': empreinte(self.elements[endpoint][str(distant_id)])}
+                         for distant_id in ids]
+            return jsonify({'items': items, 'next': ids[-1] if len(ids) == limite else None})
+
+        @app.route('/api/<endpoint>/batch', methods=['POST'])
+        def upsert_lot(endpoint):
+            if not self.lots or endpoint not in self.elements:
+                return jsonify({'success': False, 'message': 'Endpoint inconnu'}), 404
+            corps = request.get_data()
+            if request.headers.get('Content-Encoding') == 'gzip':
+                corps = gzip.decompress(corps)
+            items = json.loads(corps)['items']
+            if len(items) > self.taille_lot:
+                return jsonify({'success': False, 'message': 'Lot trop grand'}), 413
+            resultats = []
+            with self._lock:
+                for item in items:
+                    distant_id = item.get('sync_id') or str(next(self._ids))
+                    self.elements[endpoint][distant_id] = item['data']
+                    resultats.append({'success': True, 'id': distant_id})
+            return jsonify({'results': resultats})
+
+        @app.route('/api/<endpoint>', methods=['POST'])
+        @app.route('/api/<endpoint>/<distant_id>', methods=['POST'])
+        def upsert(endpoint, distant_id=None):
+            if endpoint not in self.elements:
+                return jsonify({'success': False, 'message': 'Endpoint inconnu'}), 404
+            with self._lock:
+                distant_id = distant_id or str(next(self._ids))
+                self.elements[endpoint][distant_id] = request.get_json()
+            return jsonify({'success': True, 'id': distant_id})
+
+        @app.route('/api/<endpoint>/<distant_id>', methods=['DELETE'])
+        def supprimer(endpoint, distant_id):
+            with self._lock:
+                self.elements.get(endpoint, {}).pop(distant_id, None)
+            return '', 204
+
+        return app
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._serveur.server_port}"
+
+    def start(self):
+        self._serveur = make_server('127.0.0.1', self.port, self.app, threaded=True)
+        threading.Thread(target=self._serveur.serve_forever, name='stub-site', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._serveur:
+            self._serveur.shutdown()
+            self._serveur = None
+
+    def reinitialiser(self):
+        with self._lock:
+            self.appels = 0
+            self.erreurs = 0
+            self.octets_recus = 0
+            for elements in self.elements.values():
+                elements.clear()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lance le faux site principal")
+    parser.add_argument('--port', type=int, default=5999)
+    parser.add_argument('--latence', type=float, default=0.0, help="latence par requête (secondes)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="proportion de réponses 502")
+    parser.add_argument('--sans-lots', action='store_true', help="n'annonce pas le protocole par lots")
+    args = parser.parse_args()
+
+    stub = StubSite(args.latence, args.taux_erreur, args.port, lots=not args.sans_lots).start()
+    print(f"Faux site principal sur {stub.url} (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,28 @@
+# Configuration gunicorn (chargée automatiquement depuis le répertoire courant)
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Métriques Prometheus partagées entre les workers : chaque processus écrit dans ce dossier
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'labmath-metrics'))
+
+# Migration du schéma faite une seule fois ici : les workers ne la lancent pas à l'import
+os.environ['MIGRATE_ON_STARTUP'] = 'false'
+
+
+def on_starting(server):
+    dossier = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(dossier, ignore_errors=True)
+    os.makedirs(dossier, exist_ok=True)
+
+    # Processus séparé : le maître n'ouvre pas de connexions que les workers hériteraient
+    resultat = subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'migrer-schema'])
+    if resultat.returncode != 0:
+        server.log.error("La migration du schéma a échoué (flask migrer-schema)")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,47 @@
+"""Génération des variantes d'images téléversées.
+
+Ce module est volontairement indépendant de app.py : il est importé par les
+processus du pool de traitement d'images, qui n'ont pas à initialiser Flask
+ni la base de données. Pillow est optionnel ; sans lui, seules les images
+originales sont servies.
+"""
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow non installé
+    Image = None
+
+# Variantes produites (nom -> plus grande dimension en pixels), toutes en WebP
+VARIANTES = {
+    'miniature': 320,
+    'web': 1280
+}
+
+
+def chemin_variante(dossier, variante):
+    return os.path.join(dossier, f"{variante}.webp")
+
+
+def generer_variantes(chemin_original, dossier):
+    """Produit les variantes redimensionnées d'une image ; retourne les noms des variantes créées"""
+    if Image is None:
+        return []
+
+    produites = []
+    with Image.open(chemin_original) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for variante, taille in VARIANTES.items():
+            cible = chemin_variante(dossier, variante)
+            if os.path.exists(cible):
+                continue
+            copie = image.copy()
+            copie.thumbnail((taille, taille))
+            # Écriture atomique : le fichier n'est servi qu'une fois complet
+            temporaire = f"{cible}.{os.getpid()}.tmp"
+            copie.save(temporaire, 'WEBP', quality=80, method=4)
+            os.replace(temporaire, cible)
+            produites.append(variante)
+    return produites